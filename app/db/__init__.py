@@ -3,6 +3,7 @@ from __future__ import annotations
 
 import os
 import urllib.parse as up
+from contextlib import contextmanager
 from typing import Dict, Any
 from pathlib import Path
 
@@ -78,19 +79,38 @@ def _build_sqlalchemy_url() -> str:
 
 
 # Crear Engine - SIN connect_args para pymssql
+# Nota: el engine es síncrono a propósito. Los handlers de FastAPI son
+# `def` (no `async def`), así que corren en el threadpool y no bloquean
+# el event loop; y los drivers usados (pymssql/pyodbc/pymysql) no tienen
+# variante asyncio equivalente a asyncpg.
 try:
     DATABASE_URL = _build_sqlalchemy_url()
     
-    # pymssql NO acepta connect_args, así que NO lo pasamos
-    engine = create_engine(
-        DATABASE_URL,
+    # pymssql NO acepta connect_args, así que NO lo pasamos.
+    # Pool real: las sesiones reutilizan conexiones calientes en vez de
+    # pagar el setup de conexión en cada request.
+    engine_kwargs = dict(
         future=True,
+        pool_size=20,
+        max_overflow=10,
+        pool_timeout=30,
         pool_pre_ping=True,
-        pool_recycle=280,
+        pool_recycle=3600,
         echo=False
     )
+
+    # Con pyodbc, activar el binding de parámetros por lotes (array-bound):
+    # sin esto executemany/bulk_insert_mappings envía fila por fila
+    if DATABASE_URL.startswith("mssql+pyodbc://"):
+        engine_kwargs["fast_executemany"] = True
+        print("✅ fast_executemany activado para pyodbc")
+
+    engine = create_engine(DATABASE_URL, **engine_kwargs)
     
-    SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+    SessionLocal = sessionmaker(
+        bind=engine, autoflush=False, autocommit=False,
+        expire_on_commit=False, future=True
+    )
     Base = declarative_base()
     
     print("✅ Engine de base de datos creado correctamente")
@@ -109,6 +129,20 @@ def get_db():
         db.close()
 
 
+@contextmanager
+def session_scope():
+    """Sesión con commit/rollback/close automáticos (para los servicios)"""
+    db = SessionLocal()
+    try:
+        yield db
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
 def test_connection():
     """Prueba la conexión a la base de datos"""
     try:
@@ -135,6 +169,7 @@ __all__ = [
     "SessionLocal",
     "Base",
     "get_db",
+    "session_scope",
     "test_connection",
     "get_ec_time"
 ]
@@ -8,7 +8,7 @@ from __future__ import annotations
 from typing import Optional
 from datetime import datetime
 
-from sqlalchemy import Integer, String, DateTime
+from sqlalchemy import Integer, String, DateTime, Index
 from sqlalchemy.orm import Mapped, mapped_column
 
 from app.db import Base
@@ -21,6 +21,17 @@ class DeClienteV2(Base):
     Sincronización DB2 → SQL Server (nueva versión V2)
     """
     __tablename__ = "de_clientes_rpa_v2"
+    __table_args__ = (
+        # Para el GROUP BY de estadísticas filtrado por fecha (scan de índice)
+        Index("ix_cli_fecha_estado", "FECHA_CREACION_SOLICITUD", "ESTADO_CONSULTA"),
+        # Para la búsqueda `q` del tracking (NOMBRES/APELLIDOS; CEDULA ya
+        # tiene índice propio). Un LIKE con comodín inicial no puede hacer
+        # seek, pero estos índices permiten escanear solo la columna en vez
+        # de la tabla completa; para búsqueda sub-lineal haría falta un
+        # índice full-text del motor.
+        Index("ix_cli_nombres", "NOMBRES_CLIENTE"),
+        Index("ix_cli_apellidos", "APELLIDOS_CLIENTE"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     
@@ -0,0 +1,49 @@
+# app/logging_config.py - LOGGING CENTRALIZADO NO BLOQUEANTE
+"""
+Configuración de logging para los servicios del backend.
+
+Usa QueueHandler + QueueListener para que las escrituras de log no bloqueen
+el hilo de la request: los registros se encolan y un hilo del listener los
+escribe en segundo plano. Nivel configurable vía LOG_LEVEL (INFO por defecto,
+subir a WARNING en producción).
+"""
+
+from __future__ import annotations
+
+import atexit
+import logging
+import os
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+
+_listener: QueueListener | None = None
+
+
+def _configurar() -> None:
+    """Configura el logger base 'app' una sola vez (idempotente)."""
+    global _listener
+    if _listener is not None:
+        return
+
+    nivel = getattr(logging, os.getenv("LOG_LEVEL", "INFO").upper(), logging.INFO)
+
+    cola: SimpleQueue = SimpleQueue()
+    salida = logging.StreamHandler()
+    salida.setFormatter(logging.Formatter(
+        "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+    ))
+
+    _listener = QueueListener(cola, salida, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    base = logging.getLogger("app")
+    base.setLevel(nivel)
+    base.addHandler(QueueHandler(cola))
+    base.propagate = False
+
+
+def get_logger(nombre: str) -> logging.Logger:
+    """Obtiene un logger hijo de 'app' con el handler no bloqueante ya configurado."""
+    _configurar()
+    return logging.getLogger(nombre)
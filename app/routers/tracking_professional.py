@@ -16,6 +16,7 @@ from app.services.tracking_professional import (
     get_clientes_with_filters,
     update_cliente_estado,
     crear_proceso_completo,
+    get_proceso_by_job_id,
     get_estadisticas,
     get_reporte_by_cliente,
     get_ruta_reporte
@@ -82,7 +83,9 @@ def listar_clientes_con_filtros(
     estado: Optional[str] = Query(None, description="Filtrar por ESTADO_CONSULTA (Pendiente, En_Proceso, Procesado, Error)"),
     fecha_desde: Optional[str] = Query(None, description="Fecha desde (YYYY-MM-DD)"),
     fecha_hasta: Optional[str] = Query(None, description="Fecha hasta (YYYY-MM-DD)"),
-    q: Optional[str] = Query(None, description="Búsqueda en NOMBRES_CLIENTE, APELLIDOS_CLIENTE, CEDULA")
+    q: Optional[str] = Query(None, description="Búsqueda en NOMBRES_CLIENTE, APELLIDOS_CLIENTE, CEDULA"),
+    limit: int = Query(50, ge=1, le=500, description="Tamaño de página"),
+    offset: int = Query(0, ge=0, description="Desplazamiento para paginación")
 ) -> List[Dict[str, Any]]:
     """
     Obtiene la lista de clientes de de_clientes_rpa_v2 con filtros opcionales.
@@ -101,7 +104,9 @@ def listar_clientes_con_filtros(
             estado=estado,
             fecha_desde=fecha_desde,
             fecha_hasta=fecha_hasta,
-            q=q
+            q=q,
+            limit=limit,
+            offset=offset
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error obteniendo clientes: {str(e)}")
@@ -234,6 +239,27 @@ def crear_proceso(request: CrearProcesoRequest) -> Dict[str, Any]:
         raise HTTPException(status_code=500, detail=f"Error creando proceso: {str(e)}")
 
 
+@router.get("/procesos/{job_id}", summary="Consultar proceso por job_id")
+def obtener_proceso(job_id: str) -> Dict[str, Any]:
+    """
+    Obtiene el estado de un proceso y sus consultas individuales.
+    """
+    try:
+        proceso = get_proceso_by_job_id(job_id)
+
+        if not proceso:
+            raise HTTPException(status_code=404, detail="Proceso no encontrado")
+
+        return {
+            "success": True,
+            "proceso": proceso
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error obteniendo proceso: {str(e)}")
+
+
 # ===== ENDPOINT DE ESTADÍSTICAS =====
 
 @router.get("/estadisticas", summary="Obtener estadísticas del sistema")
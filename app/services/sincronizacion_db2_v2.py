@@ -4,15 +4,54 @@ Servicio de Sincronización DB2 → SQL Server (Tabla V2) - VERSIÓN COMPLETA
 Usa conexión DIRECTA a DB2 (pyodbc, sin SQLAlchemy)
 """
 
+import threading
 from typing import Dict, Any, Optional, Tuple, List
 from datetime import datetime, date
 
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from app.db import SessionLocal
+from app.logging_config import get_logger
 from app.db.models import DeClienteV2, DeSincronizacionControl
 from app.db.origen_db2 import obtener_clientes_db2
 
+import logging
+
+logger = get_logger(__name__)
+
+# Códigos de violación de unicidad según el driver:
+# - pymssql pone el código nativo de SQL Server en args[0]
+#   (2627 = UNIQUE constraint, 2601 = índice único)
+# - pymysql/MySQL usa 1062 (Duplicate entry)
+# - pyodbc pone el SQLSTATE '23000' en args[0] y deja el código nativo
+#   dentro del mensaje, p. ej. "... (2627) (SQLExecDirectW)"
+_CODIGOS_DUPLICADO = (2627, 2601, 1062)
+_SQLSTATE_INTEGRIDAD = "23000"
+_MARCAS_DUPLICADO = ("(2627)", "(2601)", "Duplicate entry")
+
+# Último número de sincronización asignado (cache por proceso, único escritor).
+# Evita el SELECT ... ORDER BY ... DESC por cada corrida; se invalida si la
+# auditoría no se pudo registrar.
+_ultimo_numero_sync: Optional[int] = None
+_lock_numero_sync = threading.Lock()
+
+
+def _es_duplicado(exc: IntegrityError) -> bool:
+    """Determina si un IntegrityError es una violación de unicidad (código nativo o SQLSTATE según el driver)"""
+    orig = exc.orig
+    if orig is None or not orig.args:
+        return False
+    codigo = orig.args[0]
+    if codigo in _CODIGOS_DUPLICADO:
+        return True
+    if codigo == _SQLSTATE_INTEGRIDAD:
+        # El SQLSTATE 23000 también cubre FKs: confirmar contra el
+        # código nativo que pyodbc embebe en el mensaje
+        msg = str(orig.args[1]) if len(orig.args) > 1 else str(orig)
+        return any(marca in msg for marca in _MARCAS_DUPLICADO)
+    return False
+
 
 class SincronizadorDB2V2:
     """Sincronizador profesional: DB2 → de_clientes_rpa_v2"""
@@ -22,12 +61,9 @@ class SincronizadorDB2V2:
         self.log_mensajes = []
     
     def _log(self, msg: str, nivel: str = "INFO"):
-        """Logging con timestamp"""
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
-        nivel_str = f"[{nivel}]".ljust(8)
-        linea = f"{timestamp} {nivel_str} {msg}"
-        self.log_mensajes.append(linea)
-        print(linea)
+        """Logging no bloqueante (el timestamp lo agrega el formatter)"""
+        self.log_mensajes.append(msg)
+        logger.log(getattr(logging, nivel, logging.INFO), msg)
     
     def _convertir_date_a_datetime(self, valor):
         """Convierte date a datetime si es necesario"""
@@ -36,12 +72,16 @@ class SincronizadorDB2V2:
         return valor
     
     def obtener_ultimo_numero_sincronizacion(self, db_destino: Session) -> int:
-        """Obtiene el número de sincronización más reciente"""
+        """Obtiene el siguiente número de sincronización (cacheado en memoria tras la primera consulta)"""
+        global _ultimo_numero_sync
+        with _lock_numero_sync:
+            if _ultimo_numero_sync is not None:
+                return _ultimo_numero_sync + 1
         try:
             ultima = db_destino.query(DeSincronizacionControl).filter(
                 DeSincronizacionControl.nombre_proceso == self.nombre_proceso
             ).order_by(DeSincronizacionControl.numero_sincronizacion.desc()).first()
-            
+
             if ultima:
                 return ultima.numero_sincronizacion + 1
             return 1
@@ -76,14 +116,44 @@ class SincronizadorDB2V2:
             FECHA_CREACION_REGISTRO=datetime.now()
         )
     
+    def _finalizar_resultado(self, resultado: Dict[str, Any]) -> None:
+        """Cierra las métricas de tiempo del resultado"""
+        fecha_hora_fin = datetime.now()
+        resultado["fecha_hora_fin"] = fecha_hora_fin
+        resultado["duracion_segundos"] = int(
+            (fecha_hora_fin - resultado["fecha_hora_inicio"]).total_seconds()
+        )
+
+    def _crear_auditoria(self, resultado: Dict[str, Any]) -> DeSincronizacionControl:
+        """Construye la fila de auditoría desde el resultado de la sincronización"""
+        return DeSincronizacionControl(
+            nombre_proceso=self.nombre_proceso,
+            numero_sincronizacion=resultado["numero_sincronizacion"],
+            fecha_hora_inicio=resultado["fecha_hora_inicio"],
+            fecha_hora_fin=resultado["fecha_hora_fin"],
+            duracion_segundos=resultado["duracion_segundos"],
+            registros_traidos=resultado["registros_traidos"],
+            registros_insertados=resultado["registros_insertados"],
+            registros_duplicados=resultado["registros_duplicados"],
+            registros_error=resultado["registros_error"],
+            estado=resultado["estado"],
+            mensaje_resultado=resultado["mensaje"],
+            # ✅ CONVERTIR fechas minima/maxima a DATETIME si son DATE
+            fecha_minima_db2=self._convertir_date_a_datetime(resultado["fecha_minima_db2"]),
+            fecha_maxima_db2=self._convertir_date_a_datetime(resultado["fecha_maxima_db2"]),
+            fecha_creacion=resultado["fecha_hora_fin"]
+        )
+
     def sincronizar_clientes_db2(
-        self, 
-        start_date: str, 
+        self,
+        start_date: str,
         end_date: str,
         db_destino: Optional[Session] = None
     ) -> Tuple[bool, Dict[str, Any]]:
         """EJECUTA LA SINCRONIZACIÓN COMPLETA"""
-        
+
+        global _ultimo_numero_sync
+
         if db_destino is None:
             db_destino = SessionLocal()
         
@@ -137,8 +207,8 @@ class SincronizadorDB2V2:
                         db_destino.flush()
                         resultado["registros_insertados"] += 1
                         
-                    except Exception as e_insert:
-                        if "UNIQUE" in str(e_insert) or "duplicate" in str(e_insert).lower():
+                    except IntegrityError as e_insert:
+                        if _es_duplicado(e_insert):
                             resultado["registros_duplicados"] += 1
                             db_destino.rollback()
                         else:
@@ -148,69 +218,65 @@ class SincronizadorDB2V2:
                             )
                             self._log(f"   ❌ Error en registro {idx}: {str(e_insert)}", "WARN")
                             db_destino.rollback()
+                    except Exception as e_insert:
+                        resultado["registros_error"] += 1
+                        resultado["errores_detallados"].append(
+                            f"Registro {idx} (ID_SOLICITUD={reg.get('ID_SOLICITUD')}): {str(e_insert)}"
+                        )
+                        self._log(f"   ❌ Error en registro {idx}: {str(e_insert)}", "WARN")
+                        db_destino.rollback()
                 
                 self._log(f"✅ Insertados: {resultado['registros_insertados']}, Duplicados: {resultado['registros_duplicados']}, Errores: {resultado['registros_error']}")
-                
-                db_destino.commit()
-                self._log("✅ Cambios confirmados en BD destino")
-                
+
                 if resultado["registros_error"] == 0:
                     resultado["estado"] = "SUCCESS"
                     resultado["mensaje"] = f"{resultado['registros_insertados']} nuevos, {resultado['registros_duplicados']} duplicados"
                 else:
                     resultado["estado"] = "PARTIAL"
                     resultado["mensaje"] = f"Errores en {resultado['registros_error']} registros"
-            
+
+            # Auditoría en la MISMA transacción que los datos: un solo commit
+            self._finalizar_resultado(resultado)
+            db_destino.add(self._crear_auditoria(resultado))
+            db_destino.commit()
+            self._log("✅ Cambios confirmados en BD destino")
+
+            # Auditoría confirmada: el número queda asignado en memoria
+            with _lock_numero_sync:
+                _ultimo_numero_sync = numero_sync
+
+            self._log(f"📋 Auditoría registrada (ID Sync: {numero_sync})")
+
         except Exception as e:
             self._log(f"❌ ERROR CRÍTICO: {str(e)}", "ERROR")
             db_destino.rollback()
             resultado["estado"] = "ERROR"
             resultado["mensaje"] = str(e)
-            return False, resultado
-            
-        finally:
-            fecha_hora_fin = datetime.now()
-            duracion = (fecha_hora_fin - fecha_hora_inicio).total_seconds()
-            resultado["fecha_hora_fin"] = fecha_hora_fin
-            resultado["duracion_segundos"] = int(duracion)
-            
+            self._finalizar_resultado(resultado)
+
+            # Fallback: intentar registrar la auditoría en su propia transacción
             try:
-                # ✅ CONVERTIR fechas minima/maxima a DATETIME si son DATE
-                fecha_minima = self._convertir_date_a_datetime(resultado["fecha_minima_db2"])
-                fecha_maxima = self._convertir_date_a_datetime(resultado["fecha_maxima_db2"])
-                
-                auditoria = DeSincronizacionControl(
-                    nombre_proceso=self.nombre_proceso,
-                    numero_sincronizacion=numero_sync,
-                    fecha_hora_inicio=fecha_hora_inicio,
-                    fecha_hora_fin=fecha_hora_fin,
-                    duracion_segundos=int(duracion),
-                    registros_traidos=resultado["registros_traidos"],
-                    registros_insertados=resultado["registros_insertados"],
-                    registros_duplicados=resultado["registros_duplicados"],
-                    registros_error=resultado["registros_error"],
-                    estado=resultado["estado"],
-                    mensaje_resultado=resultado["mensaje"],
-                    fecha_minima_db2=fecha_minima,
-                    fecha_maxima_db2=fecha_maxima,
-                    fecha_creacion=fecha_hora_fin
-                )
-                
-                db_destino.add(auditoria)
+                db_destino.add(self._crear_auditoria(resultado))
                 db_destino.commit()
-                
+                with _lock_numero_sync:
+                    _ultimo_numero_sync = numero_sync
                 self._log(f"📋 Auditoría registrada (ID Sync: {numero_sync})")
-                
-            except Exception as e:
-                self._log(f"⚠️  Error registrando auditoría: {str(e)}", "WARN")
-            
+            except Exception as e_aud:
+                # Sin auditoría no sabemos el último número real: invalidar cache
+                with _lock_numero_sync:
+                    _ultimo_numero_sync = None
+                self._log(f"⚠️  Error registrando auditoría: {str(e_aud)}", "WARN")
+
+            return False, resultado
+
+        finally:
             if db_destino:
                 db_destino.close()
-            
+
             self._log(f"✅ SINCRONIZACIÓN #{numero_sync} FINALIZADA")
-            self._log(f"   ⏱️  Duración: {duracion:.2f} segundos")
+            self._log(f"   ⏱️  Duración: {resultado['duracion_segundos']} segundos")
             self._log(f"   📊 Resultado: {resultado['estado']}")
-        
+
         exito = resultado["estado"] in ["SUCCESS", "PARTIAL"]
         return exito, resultado
 
@@ -7,34 +7,85 @@ Incluye datos de cónyuge, codeudor y gestión de reportes
 
 from typing import List, Dict, Any, Optional
 from datetime import datetime, date
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, desc
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import or_, func, insert, literal, select, update
 import os
+import time
 
-from app.db import SessionLocal
+from app.db import session_scope
+from app.logging_config import get_logger
 from app.db.models import DeClienteV2
 from app.db.models_new import (
     DeProceso, DeConsulta, DePagina, DeReporte
 )
 
+logger = get_logger(__name__)
 
-def get_db_session() -> Session:
-    """Obtiene una sesión de base de datos"""
-    return SessionLocal()
+# Alias de estados frontend <-> BD (lookup O(1) en vez de branch por fila)
+_FRONT_TO_BD = {"En_Proceso": "Procesando"}
+_BD_TO_FRONT = {"Procesando": "En_Proceso"}
+
+# Rutas de reportes que NO estaban en disco (evita re-stat en reintentos rápidos)
+_RUTAS_NEGATIVAS: Dict[str, float] = {}
+_RUTAS_NEGATIVAS_TTL = 30.0  # segundos
+
+# Reglas de validación por código de página: lookup directo en vez de
+# recorrer la cadena de if/elif en cada página
+def _requiere_cedula10(cedula_ok: bool, nombres_ok: bool) -> bool:
+    return cedula_ok
+
+
+def _requiere_nombre_apellido(cedula_ok: bool, nombres_ok: bool) -> bool:
+    return nombres_ok
+
+
+_VALIDADORES = {
+    'deudas': (_requiere_cedula10, "requiere CI válida (10 dígitos)"),
+    'mercado_valores': (_requiere_cedula10, "requiere CI válida (10 dígitos)"),
+    'supercias_persona': (_requiere_cedula10, "requiere CI válida (10 dígitos)"),
+    'contraloria': (_requiere_cedula10, "requiere CI válida (10 dígitos)"),
+    'predio_quito': (_requiere_cedula10, "requiere CI válida (10 dígitos)"),
+    'predio_manta': (_requiere_cedula10, "requiere CI válida (10 dígitos)"),
+    'interpol': (_requiere_cedula10, "requiere CI válida (10 dígitos)"),
+    'denuncias': (_requiere_nombre_apellido, "requiere nombre y apellido completos"),
+    'google': (_requiere_nombre_apellido, "requiere nombre y apellido completos"),
+}
+
+# Cache del catálogo de páginas activas (lista casi estática, se consulta
+# en cada render del frontend)
+_PAGINAS_CACHE: Optional[List[Dict[str, Any]]] = None
+_PAGINAS_CACHE_TS = 0.0
+_PAGINAS_CACHE_TTL = 60.0  # segundos
+
+
+def invalidar_cache_paginas() -> None:
+    """Invalida el cache de páginas activas (llamar tras editar DePagina)"""
+    global _PAGINAS_CACHE
+    _PAGINAS_CACHE = None
 
 
 def get_paginas_activas() -> List[Dict[str, Any]]:
     """
     Obtiene todas las páginas activas disponibles para consulta.
     Se usa para mostrar los checkboxes en el frontend.
+
+    El resultado se cachea 60s en memoria: el catálogo es casi estático y
+    esto elimina el SELECT del hot path de cada render.
     """
-    db = get_db_session()
+    global _PAGINAS_CACHE, _PAGINAS_CACHE_TS
+
+    ahora = time.monotonic()
+    if _PAGINAS_CACHE is not None and ahora - _PAGINAS_CACHE_TS < _PAGINAS_CACHE_TTL:
+        return _PAGINAS_CACHE
+
     try:
-        paginas = db.query(DePagina).filter(
-            DePagina.activa == True
-        ).order_by(DePagina.orden_display, DePagina.nombre).all()
-        
-        return [
+        with session_scope() as db:
+            paginas = db.query(DePagina).filter(
+                DePagina.activa == True
+            ).order_by(DePagina.orden_display, DePagina.nombre).all()
+
+        resultado = [
             {
                 "id": p.id,
                 "nombre": p.nombre,
@@ -46,120 +97,139 @@ def get_paginas_activas() -> List[Dict[str, Any]]:
             }
             for p in paginas
         ]
+
+        _PAGINAS_CACHE = resultado
+        _PAGINAS_CACHE_TS = ahora
+        return resultado
     except Exception as e:
-        print(f"Error en get_paginas_activas: {e}")
+        logger.exception("Error en get_paginas_activas")
         return []
-    finally:
-        db.close()
 
 
 def get_clientes_with_filters(
     estado: Optional[str] = None,
     fecha_desde: Optional[str] = None,
     fecha_hasta: Optional[str] = None,
-    q: Optional[str] = None
+    q: Optional[str] = None,
+    limit: int = 50,
+    offset: int = 0
 ) -> List[Dict[str, Any]]:
     """
     Obtiene clientes de de_clientes_rpa_v2 con filtros opcionales.
     Retorna los campos relevantes para el frontend, incluyendo cónyuge y codeudor.
-    
+
     Estados válidos en BD: 'Pendiente', 'Procesando', 'Procesado', 'Error'
-    
+
     Filtros:
     - estado: filtra por ESTADO_CONSULTA
     - fecha_desde/hasta: filtra por FECHA_CREACION_SOLICITUD
     - q: búsqueda en NOMBRES_CLIENTE, APELLIDOS_CLIENTE, CEDULA
+    - limit/offset: paginación (el LIMIT se ejecuta en la BD, no en Python)
     """
-    db = get_db_session()
     try:
-        query = db.query(DeClienteV2)
-        
-        # Filtrar por ESTADO_CONSULTA
-        if estado and estado != "Todos":
-            # Mapear alias de estados para compatibilidad
-            estado_bd = estado
-            if estado == "En_Proceso":
-                estado_bd = "Procesando"
-            
-            query = query.filter(DeClienteV2.ESTADO_CONSULTA == estado_bd)
-        
-        # Filtrar por rango de fechas
-        if fecha_desde:
-            try:
-                fecha_desde_dt = datetime.strptime(fecha_desde, "%Y-%m-%d").date()
-                query = query.filter(DeClienteV2.FECHA_CREACION_SOLICITUD >= fecha_desde_dt)
-            except ValueError:
-                pass  # Ignorar fecha inválida
-        
-        if fecha_hasta:
-            try:
-                fecha_hasta_dt = datetime.strptime(fecha_hasta, "%Y-%m-%d").date()
-                query = query.filter(DeClienteV2.FECHA_CREACION_SOLICITUD <= fecha_hasta_dt)
-            except ValueError:
-                pass  # Ignorar fecha inválida
-        
-        # Búsqueda por nombre, apellido, CI
-        if q and q.strip():
-            search_term = f"%{q.strip()}%"
-            query = query.filter(
-                or_(
-                    DeClienteV2.NOMBRES_CLIENTE.ilike(search_term),
-                    DeClienteV2.APELLIDOS_CLIENTE.ilike(search_term),
-                    DeClienteV2.CEDULA.ilike(search_term)
-                )
-            )
-        
-        # Ordenar por fecha de creación descendente
-        query = query.order_by(DeClienteV2.FECHA_CREACION_REGISTRO.desc())
-        
-        clientes = query.all()
-        
-        # Convertir a diccionarios con los campos que necesita el frontend
-        resultado = []
-        for cliente in clientes:
-            # Convertir ESTADO_CONSULTA 'Procesando' a 'En_Proceso' para el frontend
-            estado_frontend = cliente.ESTADO_CONSULTA
-            if estado_frontend == "Procesando":
-                estado_frontend = "En_Proceso"
-            
-            resultado.append({
-                # Campos principales
-                "id": cliente.id,
-                "ID_SOLICITUD": cliente.ID_SOLICITUD,
-                "CEDULA": cliente.CEDULA,
-                "NOMBRES_CLIENTE": cliente.NOMBRES_CLIENTE,
-                "APELLIDOS_CLIENTE": cliente.APELLIDOS_CLIENTE,
-                "ESTADO_CONSULTA": estado_frontend,
-                
-                # Información de la solicitud
-                "ESTADO": cliente.ESTADO,
-                "AGENCIA": cliente.AGENCIA,
-                "ID_PRODUCTO": cliente.ID_PRODUCTO,
-                "PRODUCTO": cliente.PRODUCTO,
-                "ESTADO_CIVIL": cliente.ESTADO_CIVIL,
-                
-                # Fechas
-                "FECHA_CREACION_SOLICITUD": cliente.FECHA_CREACION_SOLICITUD.isoformat() if cliente.FECHA_CREACION_SOLICITUD else None,
-                "FECHA_CREACION_REGISTRO": cliente.FECHA_CREACION_REGISTRO.isoformat() if cliente.FECHA_CREACION_REGISTRO else None,
-                
-                # ===== DATOS DE CÓNYUGE =====
-                "CEDULA_CONYUGE": cliente.CEDULA_CONYUGE,
-                "NOMBRES_CONYUGE": cliente.NOMBRES_CONYUGE,
-                "APELLIDOS_CONYUGE": cliente.APELLIDOS_CONYUGE,
-                
-                # ===== DATOS DE CODEUDOR =====
-                "CEDULA_CODEUDOR": cliente.CEDULA_CODEUDOR,
-                "NOMBRES_CODEUDOR": cliente.NOMBRES_CODEUDOR,
-                "APELLIDOS_CODEUDOR": cliente.APELLIDOS_CODEUDOR,
-            })
-        
-        return resultado
-        
+        with session_scope() as db:
+            return _query_clientes(db, estado, fecha_desde, fecha_hasta, q, limit, offset)
     except Exception as e:
-        print(f"Error en get_clientes_with_filters: {e}")
+        logger.exception("Error en get_clientes_with_filters")
         raise e
-    finally:
-        db.close()
+
+
+def _query_clientes(
+    db: Session,
+    estado: Optional[str],
+    fecha_desde: Optional[str],
+    fecha_hasta: Optional[str],
+    q: Optional[str],
+    limit: int,
+    offset: int
+) -> List[Dict[str, Any]]:
+    """Construye y ejecuta la consulta de clientes sobre una sesión dada.
+
+    Proyecta solo las columnas que consume el frontend y lee con
+    .mappings(): sin hidratación de objetos ORM ni identity map por fila.
+    """
+    stmt = select(
+        DeClienteV2.id,
+        DeClienteV2.ID_SOLICITUD,
+        DeClienteV2.CEDULA,
+        DeClienteV2.NOMBRES_CLIENTE,
+        DeClienteV2.APELLIDOS_CLIENTE,
+        DeClienteV2.ESTADO_CONSULTA,
+        DeClienteV2.ESTADO,
+        DeClienteV2.AGENCIA,
+        DeClienteV2.ID_PRODUCTO,
+        DeClienteV2.PRODUCTO,
+        DeClienteV2.ESTADO_CIVIL,
+        DeClienteV2.FECHA_CREACION_SOLICITUD,
+        DeClienteV2.FECHA_CREACION_REGISTRO,
+        DeClienteV2.CEDULA_CONYUGE,
+        DeClienteV2.NOMBRES_CONYUGE,
+        DeClienteV2.APELLIDOS_CONYUGE,
+        DeClienteV2.CEDULA_CODEUDOR,
+        DeClienteV2.NOMBRES_CODEUDOR,
+        DeClienteV2.APELLIDOS_CODEUDOR,
+    )
+
+    # Filtrar por ESTADO_CONSULTA
+    if estado and estado != "Todos":
+        # Mapear alias de estados para compatibilidad
+        estado_bd = _FRONT_TO_BD.get(estado, estado)
+
+        stmt = stmt.where(DeClienteV2.ESTADO_CONSULTA == estado_bd)
+
+    # Filtrar por rango de fechas
+    if fecha_desde:
+        try:
+            fecha_desde_dt = date.fromisoformat(fecha_desde)
+            stmt = stmt.where(DeClienteV2.FECHA_CREACION_SOLICITUD >= fecha_desde_dt)
+        except ValueError:
+            pass  # Ignorar fecha inválida
+
+    if fecha_hasta:
+        try:
+            fecha_hasta_dt = date.fromisoformat(fecha_hasta)
+            stmt = stmt.where(DeClienteV2.FECHA_CREACION_SOLICITUD <= fecha_hasta_dt)
+        except ValueError:
+            pass  # Ignorar fecha inválida
+
+    # Búsqueda por nombre, apellido, CI
+    if q and q.strip():
+        search_term = f"%{q.strip()}%"
+        stmt = stmt.where(
+            or_(
+                DeClienteV2.NOMBRES_CLIENTE.ilike(search_term),
+                DeClienteV2.APELLIDOS_CLIENTE.ilike(search_term),
+                DeClienteV2.CEDULA.ilike(search_term)
+            )
+        )
+
+    # Ordenar por fecha de creación descendente (con id como desempate para
+    # que las páginas sean estables entre requests) y paginar en la BD
+    stmt = stmt.order_by(
+        DeClienteV2.FECHA_CREACION_REGISTRO.desc(),
+        DeClienteV2.id.desc()
+    )
+    stmt = stmt.offset(offset).limit(limit)
+
+    # Convertir a diccionarios con los campos que necesita el frontend
+    resultado = []
+    for fila in db.execute(stmt).mappings():
+        # Convertir ESTADO_CONSULTA 'Procesando' a 'En_Proceso' para el frontend
+        estado_frontend = _BD_TO_FRONT.get(fila["ESTADO_CONSULTA"], fila["ESTADO_CONSULTA"])
+
+        registro = dict(fila)
+        registro["ESTADO_CONSULTA"] = estado_frontend
+        registro["FECHA_CREACION_SOLICITUD"] = (
+            fila["FECHA_CREACION_SOLICITUD"].isoformat()
+            if fila["FECHA_CREACION_SOLICITUD"] else None
+        )
+        registro["FECHA_CREACION_REGISTRO"] = (
+            fila["FECHA_CREACION_REGISTRO"].isoformat()
+            if fila["FECHA_CREACION_REGISTRO"] else None
+        )
+        resultado.append(registro)
+
+    return resultado
 
 
 def update_cliente_estado(
@@ -175,29 +245,25 @@ def update_cliente_estado(
     
     Retorna True si se actualizó exitosamente, False si no se encontró el cliente.
     """
-    db = get_db_session()
     try:
-        cliente = db.query(DeClienteV2).filter(DeClienteV2.id == cliente_id).first()
-        
-        if not cliente:
-            return False
-        
         # Convertir alias de estados para BD
-        estado_bd = estado
-        if estado == "En_Proceso":
-            estado_bd = "Procesando"
-        
-        cliente.ESTADO_CONSULTA = estado_bd
-        db.commit()
-        
-        return True
-        
+        estado_bd = _FRONT_TO_BD.get(estado, estado)
+
+        # UPDATE directo: un solo round trip, sin hidratar el objeto ORM.
+        # rowcount cubre el chequeo de existencia; RETURNING/OUTPUT daría lo
+        # mismo pero no es portable al backend MySQL que este engine soporta.
+        stmt = update(DeClienteV2).where(
+            DeClienteV2.id == cliente_id
+        ).values(ESTADO_CONSULTA=estado_bd)
+
+        with session_scope() as db:
+            result = db.execute(stmt)
+
+        return result.rowcount > 0
+
     except Exception as e:
-        db.rollback()
-        print(f"Error en update_cliente_estado: {e}")
+        logger.exception("Error en update_cliente_estado")
         raise e
-    finally:
-        db.close()
 
 
 # ===== FUNCIONES DE REPORTES =====
@@ -207,16 +273,16 @@ def get_reporte_by_cliente(cliente_id: int) -> Optional[Dict[str, Any]]:
     Obtiene el reporte más reciente de un cliente.
     Busca en de_reportes_rpa por cliente_id.
     """
-    db = get_db_session()
     try:
-        reporte = db.query(DeReporte).filter(
-            DeReporte.cliente_id == cliente_id,
-            DeReporte.generado_exitosamente == True
-        ).order_by(DeReporte.fecha_generacion.desc()).first()
-        
+        with session_scope() as db:
+            reporte = db.query(DeReporte).filter(
+                DeReporte.cliente_id == cliente_id,
+                DeReporte.generado_exitosamente == True
+            ).order_by(DeReporte.fecha_generacion.desc()).first()
+
         if not reporte:
             return None
-        
+
         return {
             "id": reporte.id,
             "proceso_id": reporte.proceso_id,
@@ -230,26 +296,24 @@ def get_reporte_by_cliente(cliente_id: int) -> Optional[Dict[str, Any]]:
             "generado_exitosamente": reporte.generado_exitosamente
         }
     except Exception as e:
-        print(f"Error en get_reporte_by_cliente: {e}")
+        logger.exception("Error en get_reporte_by_cliente")
         return None
-    finally:
-        db.close()
 
 
 def get_reporte_by_proceso(proceso_id: int) -> Optional[Dict[str, Any]]:
     """
     Obtiene el reporte asociado a un proceso específico.
     """
-    db = get_db_session()
     try:
-        reporte = db.query(DeReporte).filter(
-            DeReporte.proceso_id == proceso_id,
-            DeReporte.generado_exitosamente == True
-        ).order_by(DeReporte.fecha_generacion.desc()).first()
-        
+        with session_scope() as db:
+            reporte = db.query(DeReporte).filter(
+                DeReporte.proceso_id == proceso_id,
+                DeReporte.generado_exitosamente == True
+            ).order_by(DeReporte.fecha_generacion.desc()).first()
+
         if not reporte:
             return None
-        
+
         return {
             "id": reporte.id,
             "proceso_id": reporte.proceso_id,
@@ -263,10 +327,8 @@ def get_reporte_by_proceso(proceso_id: int) -> Optional[Dict[str, Any]]:
             "generado_exitosamente": reporte.generado_exitosamente
         }
     except Exception as e:
-        print(f"Error en get_reporte_by_proceso: {e}")
+        logger.exception("Error en get_reporte_by_proceso")
         return None
-    finally:
-        db.close()
 
 
 def get_ruta_reporte(cliente_id: int) -> Optional[str]:
@@ -274,32 +336,75 @@ def get_ruta_reporte(cliente_id: int) -> Optional[str]:
     Obtiene la ruta del archivo del reporte más reciente de un cliente.
     Verifica que el archivo exista en disco.
     """
-    db = get_db_session()
     try:
-        reporte = db.query(DeReporte).filter(
-            DeReporte.cliente_id == cliente_id,
-            DeReporte.generado_exitosamente == True
-        ).order_by(DeReporte.fecha_generacion.desc()).first()
-        
+        with session_scope() as db:
+            reporte = db.query(DeReporte).filter(
+                DeReporte.cliente_id == cliente_id,
+                DeReporte.generado_exitosamente == True
+            ).order_by(DeReporte.fecha_generacion.desc()).first()
+
         if not reporte:
             return None
-        
+
         ruta = reporte.ruta_archivo
-        
-        # Verificar que el archivo existe
-        if ruta and os.path.exists(ruta):
+        if not ruta:
+            return None
+
+        # La BD ya filtró generado_exitosamente=True; si además registró el
+        # tamaño del archivo, confiar en ella y evitar el stat (bloqueante
+        # cuando el storage de reportes es de red)
+        if reporte.tamano_bytes:
             return ruta
-        
+
+        # Sin tamaño registrado: verificar en disco, cacheando negativos
+        ahora = time.monotonic()
+        visto = _RUTAS_NEGATIVAS.get(ruta)
+        if visto is not None and ahora - visto < _RUTAS_NEGATIVAS_TTL:
+            return None
+
+        if os.path.exists(ruta):
+            _RUTAS_NEGATIVAS.pop(ruta, None)
+            return ruta
+
+        _RUTAS_NEGATIVAS[ruta] = ahora
         return None
     except Exception as e:
-        print(f"Error en get_ruta_reporte: {e}")
+        logger.exception("Error en get_ruta_reporte")
         return None
-    finally:
-        db.close()
 
 
 # ===== FUNCIONES DE VALIDACIÓN =====
 
+def _validar(
+    cliente: DeClienteV2,
+    paginas: List[DePagina],
+    paginas_codigos: List[str]
+) -> List[str]:
+    """
+    Valida datos del cliente contra páginas ya cargadas (sin tocar la BD).
+    Retorna lista de errores (vacía si todo está bien).
+    """
+    if len(paginas) != len(paginas_codigos):
+        paginas_encontradas = [p.codigo for p in paginas]
+        paginas_faltantes = [c for c in paginas_codigos if c not in paginas_encontradas]
+        return [f"Páginas no encontradas o inactivas: {', '.join(paginas_faltantes)}"]
+
+    errores = []
+
+    # Precalcular una sola vez los datos que las reglas consultan
+    cedula_ok = bool(cliente.CEDULA and len(str(cliente.CEDULA)) == 10)
+    nombres_ok = bool(cliente.NOMBRES_CLIENTE and cliente.APELLIDOS_CLIENTE)
+
+    for pagina in paginas:
+        regla = _VALIDADORES.get(pagina.codigo)
+        if regla is not None:
+            validador, mensaje = regla
+            if not validador(cedula_ok, nombres_ok):
+                errores.append(f"{pagina.nombre} {mensaje}")
+
+    return errores
+
+
 def validar_datos_cliente_para_paginas(
     cliente_id: int,
     paginas_codigos: List[str]
@@ -308,48 +413,23 @@ def validar_datos_cliente_para_paginas(
     Valida que el cliente tenga los datos necesarios para consultar las páginas especificadas.
     Retorna lista de errores (vacía si todo está bien).
     """
-    db = get_db_session()
     try:
-        # Obtener cliente
-        cliente = db.query(DeClienteV2).filter(DeClienteV2.id == cliente_id).first()
-        if not cliente:
-            return ["Cliente no encontrado"]
-        
-        # Obtener páginas
-        paginas = db.query(DePagina).filter(
-            DePagina.codigo.in_(paginas_codigos),
-            DePagina.activa == True
-        ).all()
-        
-        if len(paginas) != len(paginas_codigos):
-            paginas_encontradas = [p.codigo for p in paginas]
-            paginas_faltantes = [c for c in paginas_codigos if c not in paginas_encontradas]
-            return [f"Páginas no encontradas o inactivas: {', '.join(paginas_faltantes)}"]
-        
-        errores = []
-        
-        # Validar datos según página
-        for pagina in paginas:
-            codigo = pagina.codigo
-            
-            if codigo in ['deudas', 'mercado_valores', 'supercias_persona']:
-                if not cliente.CEDULA or len(str(cliente.CEDULA)) != 10:
-                    errores.append(f"{pagina.nombre} requiere CI válida (10 dígitos)")
-            
-            elif codigo in ['contraloria', 'predio_quito', 'predio_manta', 'interpol']:
-                if not cliente.CEDULA or len(str(cliente.CEDULA)) != 10:
-                    errores.append(f"{pagina.nombre} requiere CI válida (10 dígitos)")
-            
-            elif codigo in ['denuncias', 'google']:
-                if not cliente.NOMBRES_CLIENTE or not cliente.APELLIDOS_CLIENTE:
-                    errores.append(f"{pagina.nombre} requiere nombre y apellido completos")
-        
-        return errores
+        with session_scope() as db:
+            # Obtener cliente
+            cliente = db.query(DeClienteV2).filter(DeClienteV2.id == cliente_id).first()
+            if not cliente:
+                return ["Cliente no encontrado"]
+
+            # Obtener páginas
+            paginas = db.query(DePagina).filter(
+                DePagina.codigo.in_(paginas_codigos),
+                DePagina.activa == True
+            ).all()
+
+        return _validar(cliente, paginas, paginas_codigos)
     except Exception as e:
-        print(f"Error en validar_datos_cliente_para_paginas: {e}")
+        logger.exception("Error en validar_datos_cliente_para_paginas")
         return [f"Error de validación: {str(e)}"]
-    finally:
-        db.close()
 
 
 def crear_proceso_completo(
@@ -362,57 +442,130 @@ def crear_proceso_completo(
     """
     Crea un proceso completo con consultas individuales para cada página.
     Retorna el ID del proceso creado.
+
+    Corre en aislamiento SERIALIZABLE para evitar write-skew entre envíos
+    concurrentes del mismo cliente/job, con hasta 3 intentos ante errores
+    transitorios de concurrencia (deadlock / serialization failure).
     """
-    db = get_db_session()
-    try:
-        # 1. Validar que el cliente existe
-        cliente = db.query(DeClienteV2).filter(DeClienteV2.id == cliente_id).first()
-        if not cliente:
-            raise ValueError("Cliente no encontrado")
-        
-        # 2. Validar datos del cliente para las páginas
-        errores = validar_datos_cliente_para_paginas(cliente_id, paginas_codigos)
-        if errores:
-            raise ValueError(f"Datos insuficientes: {'; '.join(errores)}")
-        
-        # 3. Crear proceso
-        proceso = DeProceso(
-            cliente_id=cliente_id,
-            job_id=job_id,
-            estado='Pendiente',
-            fecha_creacion=datetime.now(),
-            headless=headless,
-            generate_report=generate_report,
-            total_paginas_solicitadas=len(paginas_codigos)
-        )
-        
-        db.add(proceso)
-        db.commit()
-        
-        # 4. Crear consultas para cada página
-        paginas = db.query(DePagina).filter(
-            DePagina.codigo.in_(paginas_codigos)
-        ).all()
-        
-        for pagina in paginas:
-            consulta = DeConsulta(
-                proceso_id=proceso.id,
-                pagina_id=pagina.id,
-                estado='Pendiente',
-                fecha_creacion=datetime.now()
+    ultimo_error: Optional[Exception] = None
+    for intento in range(3):
+        try:
+            with session_scope() as db:
+                db.connection(execution_options={"isolation_level": "SERIALIZABLE"})
+                return _crear_proceso(db, cliente_id, job_id, paginas_codigos, headless, generate_report)
+        except OperationalError as e:
+            ultimo_error = e
+            logger.warning(
+                "Conflicto de concurrencia en crear_proceso_completo (intento %d/3): %s",
+                intento + 1, e
             )
-            db.add(consulta)
-        
-        db.commit()
-        
-        return proceso.id
-        
-    except Exception as e:
-        db.rollback()
-        print(f"Error en crear_proceso_completo: {e}")
-        raise e
-    finally:
-        db.close()
+            # Backoff solo si queda otro intento; tras el último se
+            # sale del loop directo al raise
+            if intento < 2:
+                time.sleep(0.2 * (2 ** intento))
+        except Exception as e:
+            logger.exception("Error en crear_proceso_completo")
+            raise e
+
+    # Fuera de los except ya no hay excepción activa: pasar el último
+    # error explícito para que el traceback no salga "NoneType: None"
+    logger.error("Error en crear_proceso_completo (reintentos agotados)", exc_info=ultimo_error)
+    raise ultimo_error
+
+
+def _crear_proceso(
+    db: Session,
+    cliente_id: int,
+    job_id: str,
+    paginas_codigos: List[str],
+    headless: bool,
+    generate_report: bool
+) -> int:
+    """Cuerpo transaccional de crear_proceso_completo (sesión ya abierta)"""
+    # 1. Validar que el cliente existe
+    cliente = db.query(DeClienteV2).filter(DeClienteV2.id == cliente_id).first()
+    if not cliente:
+        raise ValueError("Cliente no encontrado")
+
+    # 2. Obtener páginas y validar datos del cliente (misma sesión, una sola carga)
+    paginas = db.query(DePagina).filter(
+        DePagina.codigo.in_(paginas_codigos),
+        DePagina.activa == True
+    ).all()
+
+    errores = _validar(cliente, paginas, paginas_codigos)
+    if errores:
+        raise ValueError(f"Datos insuficientes: {'; '.join(errores)}")
+
+    # 3. Crear proceso
+    proceso = DeProceso(
+        cliente_id=cliente_id,
+        job_id=job_id,
+        estado='Pendiente',
+        fecha_creacion=datetime.now(),
+        headless=headless,
+        generate_report=generate_report,
+        total_paginas_solicitadas=len(paginas_codigos)
+    )
+
+    db.add(proceso)
+    db.flush()  # Obtener proceso.id sin cerrar la transacción
+
+    # 4. Crear consultas para cada página con INSERT ... SELECT: la BD
+    # genera las filas directamente desde de_paginas_rpa en un solo
+    # statement, sin construir objetos por fila en Python
+    db.execute(
+        insert(DeConsulta).from_select(
+            ["proceso_id", "pagina_id", "estado"],
+            select(literal(proceso.id), DePagina.id, literal('Pendiente'))
+            .where(DePagina.codigo.in_(paginas_codigos), DePagina.activa == True)
+        )
+    )
+
+    # session_scope confirma proceso + consultas en una sola transacción
+    return proceso.id
+
+
+def get_proceso_by_job_id(job_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Obtiene un proceso con sus consultas y páginas por job_id.
+
+    Las relaciones se cargan con selectinload (estrategia explícita):
+    número fijo de queries sin importar cuántas consultas tenga el
+    proceso, en vez de un lazy load por fila (N+1).
+    """
+    with session_scope() as db:
+        proceso = db.execute(
+            select(DeProceso)
+            .where(DeProceso.job_id == job_id)
+            .options(selectinload(DeProceso.consultas).selectinload(DeConsulta.pagina))
+        ).scalar_one_or_none()
+
+        if not proceso:
+            return None
+
+        return {
+            "id": proceso.id,
+            "job_id": proceso.job_id,
+            "cliente_id": proceso.cliente_id,
+            "estado": proceso.estado,
+            "fecha_creacion": proceso.fecha_creacion.isoformat() if proceso.fecha_creacion else None,
+            "fecha_inicio": proceso.fecha_inicio.isoformat() if proceso.fecha_inicio else None,
+            "fecha_fin": proceso.fecha_fin.isoformat() if proceso.fecha_fin else None,
+            "total_paginas_solicitadas": proceso.total_paginas_solicitadas,
+            "total_paginas_exitosas": proceso.total_paginas_exitosas,
+            "total_paginas_fallidas": proceso.total_paginas_fallidas,
+            "consultas": [
+                {
+                    "id": consulta.id,
+                    "pagina_codigo": consulta.pagina.codigo if consulta.pagina else None,
+                    "pagina_nombre": consulta.pagina.nombre if consulta.pagina else None,
+                    "estado": consulta.estado,
+                    "mensaje_error": consulta.mensaje_error
+                }
+                for consulta in proceso.consultas
+            ]
+        }
 
 
 def get_estadisticas(
@@ -421,85 +574,70 @@ def get_estadisticas(
 ) -> Dict[str, Any]:
     """
     Obtiene estadísticas del sistema.
+
+    Un solo GROUP BY por tabla (2 round-trips en total): la BD escanea cada
+    tabla una vez y los totales se derivan sumando los conteos por estado.
     """
-    db = get_db_session()
     try:
         # Parsear fechas
         fecha_desde_dt = None
         fecha_hasta_dt = None
-        
+
         if fecha_desde:
             try:
-                fecha_desde_dt = datetime.strptime(fecha_desde, "%Y-%m-%d")
+                fecha_desde_dt = date.fromisoformat(fecha_desde)
             except ValueError:
                 pass
-        
+
         if fecha_hasta:
             try:
-                fecha_hasta_dt = datetime.strptime(fecha_hasta, "%Y-%m-%d")
+                fecha_hasta_dt = date.fromisoformat(fecha_hasta)
             except ValueError:
                 pass
-        
-        # Construir filtros
-        filtro_fecha_clientes = True
-        if fecha_desde_dt:
-            filtro_fecha_clientes = and_(filtro_fecha_clientes, DeClienteV2.FECHA_CREACION_SOLICITUD >= fecha_desde_dt.date())
-        if fecha_hasta_dt:
-            filtro_fecha_clientes = and_(filtro_fecha_clientes, DeClienteV2.FECHA_CREACION_SOLICITUD <= fecha_hasta_dt.date())
-        
-        # Estadísticas de clientes V2
-        total_clientes = db.query(DeClienteV2).filter(filtro_fecha_clientes).count()
-        clientes_pendientes = db.query(DeClienteV2).filter(
-            and_(filtro_fecha_clientes, DeClienteV2.ESTADO_CONSULTA == 'Pendiente')
-        ).count()
-        clientes_procesando = db.query(DeClienteV2).filter(
-            and_(filtro_fecha_clientes, DeClienteV2.ESTADO_CONSULTA == 'Procesando')
-        ).count()
-        clientes_procesados = db.query(DeClienteV2).filter(
-            and_(filtro_fecha_clientes, DeClienteV2.ESTADO_CONSULTA == 'Procesado')
-        ).count()
-        clientes_error = db.query(DeClienteV2).filter(
-            and_(filtro_fecha_clientes, DeClienteV2.ESTADO_CONSULTA == 'Error')
-        ).count()
-        
-        # Estadísticas de procesos
-        filtro_fecha_procesos = True
+
+        # Construir filtros como listas de condiciones: sin el sentinel
+        # True ni `AND true` en el SQL emitido
+        conds_clientes = []
+        conds_procesos = []
         if fecha_desde_dt:
-            filtro_fecha_procesos = and_(filtro_fecha_procesos, DeProceso.fecha_creacion >= fecha_desde_dt)
+            conds_clientes.append(DeClienteV2.FECHA_CREACION_SOLICITUD >= fecha_desde_dt)
+            conds_procesos.append(DeProceso.fecha_creacion >= fecha_desde_dt)
         if fecha_hasta_dt:
-            filtro_fecha_procesos = and_(filtro_fecha_procesos, DeProceso.fecha_creacion <= fecha_hasta_dt)
-        
-        total_procesos = db.query(DeProceso).filter(filtro_fecha_procesos).count()
-        procesos_completados = db.query(DeProceso).filter(
-            and_(filtro_fecha_procesos, DeProceso.estado == 'Completado')
-        ).count()
-        procesos_con_errores = db.query(DeProceso).filter(
-            and_(filtro_fecha_procesos, DeProceso.estado == 'Completado_Con_Errores')
-        ).count()
-        procesos_fallidos = db.query(DeProceso).filter(
-            and_(filtro_fecha_procesos, DeProceso.estado == 'Error_Total')
-        ).count()
-        
+            conds_clientes.append(DeClienteV2.FECHA_CREACION_SOLICITUD <= fecha_hasta_dt)
+            conds_procesos.append(DeProceso.fecha_creacion <= fecha_hasta_dt)
+
+        with session_scope() as db:
+            conteo_clientes = dict(
+                db.query(DeClienteV2.ESTADO_CONSULTA, func.count())
+                .filter(*conds_clientes)
+                .group_by(DeClienteV2.ESTADO_CONSULTA)
+                .all()
+            )
+            conteo_procesos = dict(
+                db.query(DeProceso.estado, func.count())
+                .filter(*conds_procesos)
+                .group_by(DeProceso.estado)
+                .all()
+            )
+
         return {
             'clientes': {
-                'total': total_clientes,
-                'pendientes': clientes_pendientes,
-                'procesando': clientes_procesando,
-                'procesados': clientes_procesados,
-                'errores': clientes_error
+                'total': sum(conteo_clientes.values()),
+                'pendientes': conteo_clientes.get('Pendiente', 0),
+                'procesando': conteo_clientes.get('Procesando', 0),
+                'procesados': conteo_clientes.get('Procesado', 0),
+                'errores': conteo_clientes.get('Error', 0)
             },
             'procesos': {
-                'total': total_procesos,
-                'completados': procesos_completados,
-                'con_errores': procesos_con_errores,
-                'fallidos': procesos_fallidos
+                'total': sum(conteo_procesos.values()),
+                'completados': conteo_procesos.get('Completado', 0),
+                'con_errores': conteo_procesos.get('Completado_Con_Errores', 0),
+                'fallidos': conteo_procesos.get('Error_Total', 0)
             }
         }
     except Exception as e:
-        print(f"Error en get_estadisticas: {e}")
+        logger.exception("Error en get_estadisticas")
         return {
             'clientes': {'total': 0, 'pendientes': 0, 'procesando': 0, 'procesados': 0, 'errores': 0},
             'procesos': {'total': 0, 'completados': 0, 'con_errores': 0, 'fallidos': 0}
-        }
-    finally:
-        db.close()
\ No newline at end of file
+        }
\ No newline at end of file
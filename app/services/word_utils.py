@@ -1,5 +1,6 @@
 from docx.shared import Pt, RGBColor, Cm
 from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.oxml.ns import qn
 
 
 # ===== CONFIGURACIÓN GLOBAL =====
@@ -27,14 +28,25 @@ def configurar_documento(doc):
     style.font.name = FUENTE_PRINCIPAL
     style.font.size = TAMAÑO_NORMAL
     
-    # Configurar estilos de Heading también
+    # Configurar estilos de Heading también (fuente, color y tamaño una sola
+    # vez aquí; las funciones de abajo ya no tocan el formato por run)
     for i in range(1, 4):  # Heading 1, 2, 3
         try:
             heading_style = doc.styles[f"Heading {i}"]
             heading_style.font.name = FUENTE_PRINCIPAL
+            # font.name solo escribe w:ascii/w:hAnsi, pero los Heading
+            # del template traen w:asciiTheme="majorHAnsi" y por OOXML
+            # el atributo de tema prevalece sobre el literal: sin esto
+            # los títulos salen en la fuente del tema (Calibri Light)
+            rfonts = heading_style.element.get_or_add_rPr().get_or_add_rFonts()
+            for attr in ("asciiTheme", "hAnsiTheme", "eastAsiaTheme", "cstheme"):
+                rfonts.attrib.pop(qn(f"w:{attr}"), None)
+            heading_style.font.color.rgb = RGBColor(0, 0, 0)  # Negro
+            if i == 1:
+                heading_style.font.size = TAMAÑO_TITULO
         except:
             pass
-    
+
     return doc
 
 
@@ -45,16 +57,14 @@ def agregar_linea_clave_valor(doc, clave, valor):
     - Valor sin negrilla
     """
     p = doc.add_paragraph()
-    
-    # Añadir la clave en mayúsculas y negrilla
+
+    # La fuente viene del estilo Normal (configurar_documento);
+    # aquí solo se marca la negrilla de la clave
     run_clave = p.add_run(clave.upper() + ": ")
     run_clave.bold = True
-    run_clave.font.name = FUENTE_PRINCIPAL
-    
-    # Añadir el valor sin negrilla
-    run_valor = p.add_run(valor)
-    run_valor.font.name = FUENTE_PRINCIPAL
-    
+
+    p.add_run(valor)
+
     return p
 
 
@@ -62,15 +72,10 @@ def agregar_titulo_principal(doc, texto):
     """
     Agrega un título principal centrado, en mayúsculas, negro y Times New Roman.
     """
+    # Fuente, color y tamaño vienen del estilo Heading 1 (configurar_documento)
     titulo = doc.add_heading(texto.upper(), level=1)
     titulo.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    
-    # Aplicar formato a cada run
-    for run in titulo.runs:
-        run.font.color.rgb = RGBColor(0, 0, 0)  # Negro
-        run.font.name = FUENTE_PRINCIPAL
-        run.font.size = TAMAÑO_TITULO
-    
+
     return titulo
 
 
@@ -78,12 +83,8 @@ def agregar_subtitulo(doc, texto):
     """
     Agrega un subtítulo alineado a la izquierda.
     """
+    # Fuente y color vienen del estilo Heading 2 (configurar_documento)
     subtitulo = doc.add_heading(texto, level=2)
     subtitulo.alignment = WD_ALIGN_PARAGRAPH.LEFT
-    
-    # Aplicar formato
-    for run in subtitulo.runs:
-        run.font.color.rgb = RGBColor(0, 0, 0)  # Negro
-        run.font.name = FUENTE_PRINCIPAL
-    
+
     return subtitulo
\ No newline at end of file
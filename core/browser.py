@@ -16,8 +16,18 @@ import os
 import time
 import random
 import pickle
+import queue
+import threading
+from contextlib import contextmanager
 from pathlib import Path
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    import json
+    ORJSON_AVAILABLE = False
+
 try:
     import undetected_chromedriver as uc
     UNDETECTED_AVAILABLE = True
@@ -52,15 +62,26 @@ WINDOW_SIZES = [
 ]
 
 
+# Cache en memoria del User-Agent persistente (evita leer el archivo
+# en cada create_driver del mismo proceso)
+_UA_CACHE = None
+
+
 def _load_or_choose_user_agent():
     """Mantiene el mismo User-Agent entre sesiones."""
+    global _UA_CACHE
+    if _UA_CACHE:
+        return _UA_CACHE
+
     if UA_FILE.exists():
         ua = UA_FILE.read_text().strip()
         if ua:
+            _UA_CACHE = ua
             return ua
 
     ua = random.choice(USER_AGENTS)
     UA_FILE.write_text(ua)
+    _UA_CACHE = ua
     return ua
 
 
@@ -69,57 +90,115 @@ def human_delay(min_s=0.8, max_s=2.4):
     time.sleep(random.uniform(min_s, max_s))
 
 
+# Script de stealth completo, concatenado una sola vez por proceso:
+# un único comando CDP en vez de cuatro round-trips por driver
+_STEALTH_JS = "\n".join([
+    # webdriver
+    """Object.defineProperty(navigator, 'webdriver', {get: () => undefined});""",
+
+    # Languages
+    """Object.defineProperty(navigator, 'languages', {get: () => ['es-EC','es','en-US']});""",
+
+    # Plugins falsos
+    """Object.defineProperty(navigator, 'plugins', {get: () => [1,2,3]});""",
+
+    # WebGL vendor spoof
+    """
+    const getParameter = WebGLRenderingContext.prototype.getParameter;
+    WebGLRenderingContext.prototype.getParameter = function(parameter) {
+        if (parameter === 37445) return "Intel Inc.";
+        if (parameter === 37446) return "Intel Iris OpenGL";
+        return getParameter(parameter);
+    };
+    """
+])
+
+
 def _apply_stealth_js(driver):
     """Fingerprints ocultos extra."""
-    scripts = [
-        # webdriver
-        """Object.defineProperty(navigator, 'webdriver', {get: () => undefined});""",
-
-        # Languages
-        """Object.defineProperty(navigator, 'languages', {get: () => ['es-EC','es','en-US']});""",
-
-        # Plugins falsos
-        """Object.defineProperty(navigator, 'plugins', {get: () => [1,2,3]});""",
-
-        # WebGL vendor spoof
-        """
-        const getParameter = WebGLRenderingContext.prototype.getParameter;
-        WebGLRenderingContext.prototype.getParameter = function(parameter) {
-            if (parameter === 37445) return "Intel Inc.";
-            if (parameter === 37446) return "Intel Iris OpenGL";
-            return getParameter(parameter);
-        };
-        """
-    ]
-
-    for s in scripts:
-        try:
-            driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": s})
-        except:
-            pass
+    try:
+        driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": _STEALTH_JS})
+    except:
+        pass
+
+
+def _dump_cookies(cookies):
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(cookies)
+    return json.dumps(cookies).encode("utf-8")
+
+
+def _load_cookies_bytes(data):
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
 
 
 def save_cookies(driver, name="funcionjudicial"):
     try:
-        file = COOKIES_DIR / f"{name}.pkl"
-        pickle.dump(driver.get_cookies(), file.open("wb"))
+        file = COOKIES_DIR / f"{name}.json"
+        file.write_bytes(_dump_cookies(driver.get_cookies()))
         log("Cookies guardadas correctamente")
     except Exception as e:
         log(f"Error guardando cookies: {e}")
 
 
+def _leer_cookies(name):
+    """Lee cookies desde JSON, migrando el .pkl viejo si aún existe."""
+    file = COOKIES_DIR / f"{name}.json"
+    if file.exists():
+        return _load_cookies_bytes(file.read_bytes())
+
+    # Migración única desde el formato pickle anterior
+    legacy = COOKIES_DIR / f"{name}.pkl"
+    if legacy.exists():
+        cookies = pickle.load(legacy.open("rb"))
+        try:
+            file.write_bytes(_dump_cookies(cookies))
+            legacy.unlink()
+            log("Cookies migradas de pickle a JSON")
+        except Exception as e:
+            log(f"No se pudo migrar cookies a JSON: {e}")
+        return cookies
+
+    return None
+
+
+# Claves que CDP CookieParam comparte con el dict de cookies de
+# Selenium; lo que CDP no conoce lo descarta en silencio
+_CDP_COOKIE_KEYS = ("name", "value", "domain", "path", "secure", "httpOnly", "sameSite")
+
+
+def _a_cookie_param(cookie):
+    """Traduce un dict de cookie de Selenium al CookieParam de CDP.
+
+    Selenium guarda la expiración como 'expiry' pero CDP espera
+    'expires'; sin traducir, CDP ignoraba la clave y cada cookie
+    restaurada quedaba de sesión (y sin excepción que avisara).
+    """
+    param = {k: cookie[k] for k in _CDP_COOKIE_KEYS if k in cookie}
+    if "expiry" in cookie:
+        param["expires"] = cookie["expiry"]
+    return param
+
+
 def load_cookies(driver, name="funcionjudicial"):
     try:
-        file = COOKIES_DIR / f"{name}.pkl"
-        if not file.exists():
+        cookies = _leer_cookies(name)
+        if cookies is None:
             return False
 
-        cookies = pickle.load(file.open("rb"))
-        for c in cookies:
-            try:
-                driver.add_cookie(c)
-            except:
-                pass
+        # Un solo comando CDP en vez de un round-trip por cookie
+        try:
+            driver.execute_cdp_cmd("Network.setCookies", {
+                "cookies": [_a_cookie_param(c) for c in cookies]
+            })
+        except Exception:
+            for c in cookies:
+                try:
+                    driver.add_cookie(c)
+                except:
+                    pass
 
         log("Cookies cargadas correctamente")
         return True
@@ -222,3 +301,100 @@ def close_driver(driver, save=True, cookies_domain="funcionjudicial"):
         driver.quit()
     except:
         pass
+
+
+class DriverPool:
+    """
+    Pool acotado de WebDrivers reutilizables.
+
+    create_driver() paga varios segundos de costo fijo (arranque de
+    Chrome, comandos CDP, navegación de warm-up, cookies). Para lotes de
+    muchos clientes ese costo domina el tiempo total, así que en vez de
+    crear/cerrar un driver por job se reutilizan hasta max_size drivers:
+
+        pool = DriverPool(max_size=2)
+        with pool.acquire() as driver:
+            ...
+
+    Al liberar, el driver se limpia (delete_all_cookies + about:blank)
+    en vez de hacer quit(). close_all() cierra todo al terminar el lote.
+    """
+
+    def __init__(self, max_size=2, headless=False, use_cookies=True,
+                 cookies_domain="funcionjudicial"):
+        self.max_size = max_size
+        self.headless = headless
+        self.use_cookies = use_cookies
+        self.cookies_domain = cookies_domain
+
+        # LIFO: se prefiere el driver usado más recientemente (caliente)
+        self._disponibles = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._creados = 0
+
+    def _checkout(self):
+        while True:
+            try:
+                return self._disponibles.get_nowait()
+            except queue.Empty:
+                pass
+
+            with self._lock:
+                if self._creados < self.max_size:
+                    self._creados += 1
+                    try:
+                        return create_driver(
+                            headless=self.headless,
+                            use_cookies=self.use_cookies,
+                            cookies_domain=self.cookies_domain
+                        )
+                    except Exception:
+                        self._creados -= 1
+                        raise
+
+            # Pool lleno: esperar con timeout acotado y volver a empezar.
+            # El descarte de un driver muerto libera cupo (_creados -= 1)
+            # pero no encola nada, así que un get() sin timeout dejaba al
+            # que esperaba colgado para siempre; al reintentar, el waiter
+            # pasa de nuevo por la rama de crear-si-hay-cupo
+            try:
+                return self._disponibles.get(timeout=1.0)
+            except queue.Empty:
+                continue
+
+    def _reset(self, driver):
+        """Deja el driver limpio para el siguiente job (sin quit)."""
+        driver.delete_all_cookies()
+        driver.get("about:blank")
+
+    @contextmanager
+    def acquire(self):
+        driver = self._checkout()
+        try:
+            yield driver
+        except Exception:
+            # Driver en estado desconocido: se descarta y se libera el cupo
+            with self._lock:
+                self._creados -= 1
+            close_driver(driver, save=False)
+            raise
+        else:
+            try:
+                self._reset(driver)
+                self._disponibles.put(driver)
+            except Exception as e:
+                log(f"Driver no reutilizable, se descarta: {e}")
+                with self._lock:
+                    self._creados -= 1
+                close_driver(driver, save=False)
+
+    def close_all(self, save=True):
+        """Cierra todos los drivers ociosos del pool."""
+        while True:
+            try:
+                driver = self._disponibles.get_nowait()
+            except queue.Empty:
+                break
+            with self._lock:
+                self._creados -= 1
+            close_driver(driver, save=save, cookies_domain=self.cookies_domain)
@@ -5,14 +5,29 @@ Solo se usa cuando aparece la ventana de imágenes, ahorrando créditos.
 """
 
 import time
+import traceback
 import requests
 import urllib.parse as up
 from typing import Optional, Tuple
 
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    import json
+    _json_loads = json.loads
+
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
 from selenium.webdriver.common.by import By
 from selenium.webdriver.remote.webdriver import WebDriver
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException
 
 from core.utils.log import log
+from core.config import CAPSOLVER_URL, CAPSOLVER_RESULT_URL
 
 
 # ============= CONFIGURACIÓN =============
@@ -22,9 +37,63 @@ CAPSOLVER_API_KEY = "CAP-E6752C17A4ABA2B00B5CA4709EB0624568BE753E83D3C4885B1AD5F
 # Sitekey quemado de Función Judicial (puede cambiar)
 DEFAULT_SITEKEY = "6LfjVAcUAAAAANT1V80aWo"
 
+# Tokens resueltos recientes por (sitekey, dominio). Un token de
+# reCAPTCHA v2 vale ~120s en el mismo dominio: reusarlo dentro de esa
+# ventana ahorra un solve completo (~30s + créditos) en reintentos
+_TOKEN_CACHE = {}
+_TOKEN_TTL = 110.0  # segundos (margen bajo los ~120s de validez)
+
+# Sesión HTTP compartida con keep-alive: un solve hace 1 createTask +
+# varios getTaskResult, y sin sesión cada uno paga TCP + TLS completos
+_SESSION = requests.Session()
+_SESSION.headers["Connection"] = "keep-alive"
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=8,
+    max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=[502, 503, 504])
+))
+
 
 # ============= DETECCIÓN DE RECAPTCHA =============
 
+# Script de detección de la ventana de imágenes, construido una sola vez
+# por proceso: mismo source en cada execute_script, así V8 puede reusar
+# el script compilado entre invocaciones
+_DETECT_VENTANA_JS = """
+    const visible = (el) => {
+        const style = window.getComputedStyle(el);
+        return style.display !== 'none' && style.visibility !== 'hidden';
+    };
+
+    // Contenedores del desafío de imágenes
+    const imageSelectDivs = document.querySelectorAll(
+        'div[class*="rc-imageselect"], table[class*="rc-imageselect-table"]'
+    );
+    for (let div of imageSelectDivs) {
+        if (visible(div)) return true;
+    }
+
+    // Iframes del desafío
+    const iframes = document.querySelectorAll('iframe');
+    for (let iframe of iframes) {
+        const src = iframe.src || '';
+        if ((src.includes('bframe') && src.includes('recaptcha')) || src.includes('api2/bframe')) {
+            if (visible(iframe)) return true;
+        }
+    }
+
+    // Texto de instrucciones del desafío
+    for (let strong of document.querySelectorAll('strong')) {
+        const t = strong.textContent || '';
+        if ((t.includes('Select all images') || t.includes('Selecciona todas las imágenes'))
+            && visible(strong)) {
+            return true;
+        }
+    }
+
+    return false;
+"""
+
 def detectar_recaptcha_iframe(driver: WebDriver) -> Tuple[bool, Optional[str], str]:
     """
     Detecta iframes de reCAPTCHA y extrae el sitekey.
@@ -32,6 +101,28 @@ def detectar_recaptcha_iframe(driver: WebDriver) -> Tuple[bool, Optional[str], s
     Returns:
         Tuple[bool, Optional[str], str]: (hay_recaptcha, sitekey, url_actual)
     """
+    # Un solo execute_script en vez de find_elements + un get_attribute
+    # por iframe (cada uno es un round-trip WebDriver)
+    try:
+        resultado = driver.execute_script("""
+            for (const f of document.querySelectorAll('iframe')) {
+                const s = f.src || '';
+                if (s.includes('recaptcha')) {
+                    return s;
+                }
+            }
+            return null;
+        """)
+        if resultado:
+            query = up.urlparse(resultado).query
+            params = dict(up.parse_qsl(query))
+            sitekey = params.get("k")
+            return True, sitekey, driver.current_url
+        return False, None, driver.current_url
+    except Exception as e:
+        log(f"Error en scan JS de iframes, usando fallback: {e}")
+
+    # Fallback: recorrido clásico vía WebDriver
     try:
         iframes = driver.find_elements(By.TAG_NAME, "iframe")
         for iframe in iframes:
@@ -43,7 +134,7 @@ def detectar_recaptcha_iframe(driver: WebDriver) -> Tuple[bool, Optional[str], s
                 return True, sitekey, driver.current_url
     except Exception as e:
         log(f"Error detectando iframe recaptcha: {e}")
-    
+
     return False, None, driver.current_url
 
 
@@ -59,103 +150,38 @@ def detectar_ventana_imagenes_recaptcha(driver: WebDriver, timeout: int = 5) ->
         bool: True si detectó la ventana de imágenes, False si no apareció
     """
     log("Detectando ventana modal de imágenes del reCAPTCHA...")
-    
+
     try:
-        # Esperar un poco para que la ventana aparezca si va a aparecer
-        time.sleep(1.5)
-        
-        # ===== MÉTODO 1: Buscar iframe del desafío de imágenes (bframe) =====
-        iframes = driver.find_elements(By.TAG_NAME, "iframe")
-        for iframe in iframes:
-            try:
-                src = iframe.get_attribute("src") or ""
-                # El iframe del desafío de imágenes contiene "api2/bframe" o "recaptcha/api2/bframe"
-                if ("bframe" in src and "recaptcha" in src) or "api2/bframe" in src:
-                    # Verificar si el iframe es visible
-                    if iframe.is_displayed():
-                        log(f"Iframe de desafío de imágenes detectado: {src[:80]}...")
-                        return True
-            except:
-                continue
-        
-        # ===== MÉTODO 2: Buscar el contenedor de selección de imágenes directamente =====
-        selectores_ventana_imagenes = [
-            "div.rc-imageselect",
-            "div.rc-imageselect-challenge",
-            "div.rc-imageselect-target",
-            "table.rc-imageselect-table-33",
-            "table.rc-imageselect-table-44",
-            "div.rc-imageselect-incorrect-response",
-            "div.rc-imageselect-desc",
-            "div.rc-imageselect-instructions"
-        ]
-        
-        for selector in selectores_ventana_imagenes:
-            try:
-                elementos = driver.find_elements(By.CSS_SELECTOR, selector)
-                for elemento in elementos:
-                    if elemento.is_displayed():
-                        log(f"Elemento de ventana de imágenes detectado: {selector}")
-                        return True
-            except:
-                continue
-        
-        # ===== MÉTODO 3: Buscar por XPath elementos específicos del desafío =====
-        xpaths_ventana = [
-            "//div[contains(@class, 'rc-imageselect')]",
-            "//div[contains(@class, 'rc-imageselect-challenge')]",
-            "//strong[contains(text(), 'Select all images') or contains(text(), 'Selecciona todas las imágenes')]"
-        ]
-        
-        for xpath in xpaths_ventana:
-            try:
-                elementos = driver.find_elements(By.XPATH, xpath)
-                for elemento in elementos:
-                    if elemento.is_displayed():
-                        log("Ventana de imágenes detectada por XPath")
-                        return True
-            except:
-                continue
-        
-        # ===== MÉTODO 4: Verificar en el DOM completo con JavaScript =====
+        # ===== MÉTODO 1: Esperar el iframe del desafío (bframe) de forma
+        # reactiva: retorna apenas se vuelve visible, sin sleeps fijos =====
         try:
-            resultado = driver.execute_script("""
-                // Buscar elementos visibles que indiquen el desafío de imágenes
-                const imageSelectDivs = document.querySelectorAll('div[class*="rc-imageselect"]');
-                for (let div of imageSelectDivs) {
-                    const style = window.getComputedStyle(div);
-                    if (style.display !== 'none' && style.visibility !== 'hidden') {
-                        return true;
-                    }
-                }
-                
-                // Buscar iframes del desafío
-                const iframes = document.querySelectorAll('iframe');
-                for (let iframe of iframes) {
-                    const src = iframe.src || '';
-                    if ((src.includes('bframe') && src.includes('recaptcha')) || src.includes('api2/bframe')) {
-                        const style = window.getComputedStyle(iframe);
-                        if (style.display !== 'none' && style.visibility !== 'hidden') {
-                            return true;
-                        }
-                    }
-                }
-                
-                return false;
-            """)
-            
+            WebDriverWait(driver, 3).until(
+                EC.visibility_of_element_located((By.CSS_SELECTOR, "iframe[src*='bframe']"))
+            )
+            log("Iframe de desafío de imágenes detectado (bframe visible)")
+            return True
+        except TimeoutException:
+            pass
+
+        # ===== MÉTODO 2: Verificar todo el DOM en un solo round-trip JS
+        # (contenedores rc-imageselect, iframes bframe y texto del desafío,
+        # lo que antes eran ~12 comandos WebDriver separados). Cubre
+        # variantes que el selector de bframe no ve, al costo de un solo
+        # round-trip en el caso negativo =====
+        try:
+            resultado = driver.execute_script(_DETECT_VENTANA_JS)
+
             if resultado:
                 log("Ventana de imágenes detectada por JavaScript")
                 return True
         except Exception as e:
             log(f"Error en detección JavaScript: {e}")
-        
+
         log("No se detectó ventana de imágenes - el checkbox se resolvió automáticamente")
         return False
         
     except Exception as e:
         log(f"Error en detección de ventana de imágenes: {e}")
-        import traceback
         traceback.print_exc()
         return False
 
@@ -194,13 +220,16 @@ def crear_tarea_capsolver(
         }
     }
     
-    response = requests.post(
-        "https://api.capsolver.com/createTask",
+    response = _SESSION.post(
+        CAPSOLVER_URL,
         json=payload,
         timeout=timeout
     )
     
-    result = response.json()
+    if response.status_code >= 400:
+        raise Exception(f"HTTP {response.status_code} en createTask: {response.text[:200]}")
+
+    result = _json_loads(response.content)
     
     if result.get("errorId", 0) != 0:
         raise Exception(f"Error creando tarea CapSolver: {result}")
@@ -211,55 +240,169 @@ def crear_tarea_capsolver(
     return task_id
 
 
+def crear_tareas_capsolver_batch(
+    site_urls,
+    site_keys,
+    api_key: str = CAPSOLVER_API_KEY,
+    max_workers: int = 4
+):
+    """
+    Crea varias tareas CapSolver en paralelo.
+
+    Un solve tarda ~30s; cuando hay un lote de consultas en cola conviene
+    pre-enviar las tareas de los siguientes items mientras se procesa el
+    actual, para que los solves se solapen en vez de sumarse.
+
+    Args:
+        site_urls: URLs de los sitios (una por tarea)
+        site_keys: Sitekeys correspondientes (misma longitud)
+        api_key: Tu API key de CapSolver
+        max_workers: Hilos concurrentes para createTask
+
+    Returns:
+        list: Task IDs en el mismo orden que site_urls (None si falló)
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    def _crear(args):
+        url, key = args
+        try:
+            return crear_tarea_capsolver(site_url=url, site_key=key, api_key=api_key)
+        except Exception as e:
+            log(f"Error creando tarea batch para {url}: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(_crear, zip(site_urls, site_keys)))
+
+
 def obtener_resultado_capsolver(
     task_id: str,
     api_key: str = CAPSOLVER_API_KEY,
-    wait_interval: int = 3,
+    initial_interval: float = 2.0,
+    max_interval: float = 5.0,
+    backoff_multiplier: float = 1.5,
+    first_poll_delay: float = 12.0,
     max_wait_s: int = 180
 ) -> str:
     """
     Espera y obtiene el resultado de una tarea de CapSolver.
-    
+
+    Un desafío de imágenes tarda normalmente 20-40s en resolverse, así que
+    se espera first_poll_delay antes de la primera consulta y luego se
+    consulta con backoff exponencial (initial_interval * backoff_multiplier
+    hasta max_interval) en vez de un intervalo fijo: menos requests HTTP
+    inútiles mientras la tarea sigue en "processing".
+
     Args:
         task_id: ID de la tarea
         api_key: Tu API key de CapSolver
-        wait_interval: Segundos entre cada consulta
+        initial_interval: Segundos de espera tras la primera consulta
+        max_interval: Tope del intervalo entre consultas
+        backoff_multiplier: Factor de crecimiento del intervalo
+        first_poll_delay: Espera antes de la primera consulta
         max_wait_s: Máximo tiempo de espera total
-    
+
     Returns:
         str: Token de reCAPTCHA resuelto
-    
+
     Raises:
         TimeoutError: Si no se resuelve en el tiempo máximo
         Exception: Si hay error obteniendo el resultado
     """
     log(f"Esperando resultado CapSolver para task {task_id}...")
-    
-    start_time = time.time()
-    
-    while time.time() - start_time < max_wait_s:
-        response = requests.post(
-            "https://api.capsolver.com/getTaskResult",
+
+    # Deadline con reloj monotónico: inmune a ajustes NTP del reloj de pared
+    deadline = time.monotonic() + max_wait_s
+
+    # Un resultado casi nunca está listo antes de ~15s
+    time.sleep(min(first_poll_delay, max_wait_s))
+
+    interval = initial_interval
+    while time.monotonic() < deadline:
+        response = _SESSION.post(
+            CAPSOLVER_RESULT_URL,
             json={
                 "clientKey": api_key,
                 "taskId": task_id
             },
             timeout=30
         )
-        
-        result = response.json()
-        
+
+        if response.status_code >= 400:
+            raise Exception(f"HTTP {response.status_code} en getTaskResult: {response.text[:200]}")
+
+        result = _json_loads(response.content)
+
         if result.get("status") == "ready":
             token = result["solution"]["gRecaptchaResponse"]
             log(f"CapSolver devolvió token (len={len(token)})")
             return token
-        
+
         if result.get("errorId", 0) != 0:
             raise Exception(f"Error en getTaskResult: {result}")
-        
-        log(f"Procesando... esperando {wait_interval}s")
-        time.sleep(wait_interval)
-    
+
+        log(f"Procesando... esperando {interval:.1f}s")
+        time.sleep(interval)
+        interval = min(interval * backoff_multiplier, max_interval)
+
+    raise TimeoutError("Timeout esperando solución de CapSolver")
+
+
+async def obtener_resultado_capsolver_async(
+    task_id: str,
+    api_key: str = CAPSOLVER_API_KEY,
+    initial_interval: float = 2.0,
+    max_interval: float = 5.0,
+    backoff_multiplier: float = 1.5,
+    first_poll_delay: float = 12.0,
+    max_wait_s: int = 180
+) -> str:
+    """
+    Variante asyncio de obtener_resultado_capsolver (mismo backoff).
+
+    La espera del token es I/O puro contra la API, así que con esta
+    versión varios solves pueden estar en vuelo sobre un solo hilo
+    (await en vez de bloquear un worker durante hasta 180s). Usa httpx,
+    que ya es dependencia del proyecto (fallback de Función Judicial).
+    """
+    import asyncio
+    import httpx
+
+    log(f"Esperando resultado CapSolver para task {task_id} (async)...")
+
+    deadline = time.monotonic() + max_wait_s
+
+    await asyncio.sleep(min(first_poll_delay, max_wait_s))
+
+    interval = initial_interval
+    async with httpx.AsyncClient(timeout=30) as client:
+        while time.monotonic() < deadline:
+            response = await client.post(
+                CAPSOLVER_RESULT_URL,
+                json={
+                    "clientKey": api_key,
+                    "taskId": task_id
+                }
+            )
+
+            if response.status_code >= 400:
+                raise Exception(f"HTTP {response.status_code} en getTaskResult: {response.text[:200]}")
+
+            result = _json_loads(response.content)
+
+            if result.get("status") == "ready":
+                token = result["solution"]["gRecaptchaResponse"]
+                log(f"CapSolver devolvió token (len={len(token)})")
+                return token
+
+            if result.get("errorId", 0) != 0:
+                raise Exception(f"Error en getTaskResult: {result}")
+
+            log(f"Procesando... esperando {interval:.1f}s")
+            await asyncio.sleep(interval)
+            interval = min(interval * backoff_multiplier, max_interval)
+
     raise TimeoutError("Timeout esperando solución de CapSolver")
 
 
@@ -273,24 +416,19 @@ def inyectar_token_en_pagina(driver: WebDriver, token: str):
     """
     log("Inyectando token en la página...")
     
+    # reCAPTCHA lee textarea.value al enviar el formulario; no hace falta
+    # despachar eventos input/change ni envolver en IIFE
     js_code = """
-    (function(token) {
-        var textarea = document.querySelector('textarea[name="g-recaptcha-response"]');
-        var parent = document.querySelector('form') || document.body;
-        
-        if (!textarea) {
-            textarea = document.createElement('textarea');
-            textarea.name = 'g-recaptcha-response';
-            textarea.style.display = 'none';
-            parent.appendChild(textarea);
-        }
-        
-        textarea.value = token;
-        textarea.dispatchEvent(new Event('input', { bubbles: true }));
-        textarea.dispatchEvent(new Event('change', { bubbles: true }));
-    })(arguments[0]);
+    var t = document.querySelector('textarea[name="g-recaptcha-response"]');
+    if (!t) {
+        t = document.createElement('textarea');
+        t.name = 'g-recaptcha-response';
+        t.style.display = 'none';
+        (document.querySelector('form') || document.body).appendChild(t);
+    }
+    t.value = arguments[0];
     """
-    
+
     driver.execute_script(js_code, token)
     log("Token inyectado en textarea[name='g-recaptcha-response']")
 
@@ -320,10 +458,8 @@ def resolver_recaptcha_si_necesario(
     log("VERIFICANDO SI ES NECESARIO RESOLVER RECAPTCHA...")
     log("=" * 60)
     
-    # Esperar para que aparezca la ventana si va a aparecer
-    time.sleep(2.0)
-    
-    # Detectar si apareció ventana de imágenes
+    # Detectar si apareció ventana de imágenes (la espera reactiva
+    # está dentro de la detección; sin sleeps fijos aquí)
     ventana_imagenes_aparecio = detectar_ventana_imagenes_recaptcha(driver)
     
     if not ventana_imagenes_aparecio:
@@ -335,30 +471,42 @@ def resolver_recaptcha_si_necesario(
     log("Ventana de imágenes detectada - Usando CapSolver para resolver...")
     
     try:
-        # Obtener sitekey
-        hay_iframe, sitekey_detected, page_url = detectar_recaptcha_iframe(driver)
-        sitekey = sitekey_override or sitekey_detected or DEFAULT_SITEKEY
-        
+        # Obtener sitekey (si viene override no hace falta escanear iframes)
+        if sitekey_override:
+            sitekey = sitekey_override
+            page_url = driver.current_url
+        else:
+            hay_iframe, sitekey_detected, page_url = detectar_recaptcha_iframe(driver)
+            sitekey = sitekey_detected or DEFAULT_SITEKEY
+
         log(f"Resolviendo reCAPTCHA: sitekey={sitekey}")
-        
+
+        # Reusar un token vigente del mismo sitekey/dominio si lo hay
+        cache_key = (sitekey, up.urlparse(page_url).netloc)
+        cacheado = _TOKEN_CACHE.get(cache_key)
+        if cacheado and time.time() - cacheado[1] < _TOKEN_TTL:
+            log("Token reCAPTCHA vigente en cache - se reinyecta sin llamar a CapSolver")
+            inyectar_token_en_pagina(driver, cacheado[0])
+            return True
+
         # Crear tarea en CapSolver
         task_id = crear_tarea_capsolver(
             site_url=page_url,
             site_key=sitekey,
             api_key=api_key
         )
-        
+
         # Obtener token resuelto
         token = obtener_resultado_capsolver(task_id, api_key=api_key, max_wait_s=180)
-        
+
         # Inyectar token en la página
         inyectar_token_en_pagina(driver, token)
-        
+        _TOKEN_CACHE[cache_key] = (token, time.time())
+
         log("reCAPTCHA resuelto exitosamente con CapSolver")
         return True
         
     except Exception as e:
         log(f"Error resolviendo reCAPTCHA con CapSolver: {e}")
-        import traceback
         traceback.print_exc()
         return False
\ No newline at end of file
@@ -25,11 +25,15 @@ FISCALIAS_DENUNCIAS_URL = os.getenv(
 
 # === Salida base ===
 OUTPUT_DIR = os.getenv("OUTPUT_DIR", "sri_ruc_output")
-os.makedirs(OUTPUT_DIR, exist_ok=True)
+# isdir primero: evita la cascada de stat/mkdir de os.makedirs en cada
+# arranque de proceso cuando los directorios ya existen
+if not os.path.isdir(OUTPUT_DIR):
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
 
 # Capturas finales
 SCREENSHOT_DIR = os.path.join(OUTPUT_DIR, "screenshots")
-os.makedirs(SCREENSHOT_DIR, exist_ok=True)
+if not os.path.isdir(SCREENSHOT_DIR):
+    os.makedirs(SCREENSHOT_DIR, exist_ok=True)
 
 # Caché
 CACHE_HOURS = int(os.getenv("CACHE_HOURS", "24"))
@@ -55,7 +59,8 @@ MOUSE_JITTER = int(os.getenv("MOUSE_JITTER", "2"))
 
 # === LOGS (archivo único) ===
 LOG_DIR = os.path.join(OUTPUT_DIR, "logs")
-os.makedirs(LOG_DIR, exist_ok=True)
+if not os.path.isdir(LOG_DIR):
+    os.makedirs(LOG_DIR, exist_ok=True)
 LOG_FILE = os.path.join(LOG_DIR, "app.log")
 
 # === Demora entre items (secuencial) ===
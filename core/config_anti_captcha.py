@@ -4,6 +4,8 @@ Configuración específica para evitar captchas.
 Ajusta estos valores según la frecuencia de aparición de captchas.
 """
 
+import re
+
 # Delays entre acciones (en segundos)
 ANTI_CAPTCHA_DELAYS = {
     # Delay después de cargar página inicial
@@ -55,6 +57,13 @@ CAPTCHA_INDICATORS = [
     "suspicious activity",
 ]
 
+# Regex precompilado de los indicadores: una sola pasada sobre el HTML
+# (CAPTCHA_INDICATORS_RE.search(html)) en vez de un `in` por indicador
+CAPTCHA_INDICATORS_RE = re.compile(
+    "|".join(map(re.escape, CAPTCHA_INDICATORS)),
+    re.IGNORECASE
+)
+
 # Estrategia si se detecta captcha
 ON_CAPTCHA_DETECTED = "abort"  # Opciones: "abort", "retry_later", "manual"
 RETRY_DELAY_AFTER_CAPTCHA = 600  # 10 minutos
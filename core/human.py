@@ -9,6 +9,8 @@ import random
 import math
 from typing import Optional
 
+import numpy as np
+
 from selenium.webdriver.remote.webdriver import WebDriver
 from selenium.webdriver.remote.webelement import WebElement
 from selenium.webdriver.common.action_chains import ActionChains
@@ -20,15 +22,60 @@ from core.utils.log import log
 
 def wait_random(min_sec: float = 0.5, max_sec: float = 2.0):
     """Espera con variación humana"""
+    # Sin rango no hay nada que sortear: directo al sleep
+    if min_sec >= max_sec:
+        time.sleep(min_sec)
+        return
     time.sleep(random.uniform(min_sec, max_sec))
 
 
 # ============= SCROLL SUAVE Y REALISTA =============
 
+# Ejecuta un cronograma [(dy, ms), ...] de scrolls dentro del navegador:
+# un solo round-trip WebDriver en vez de uno por paso
+_SCROLL_SCHEDULE_JS = """
+    const schedule = arguments[0];
+    const scrollTop = arguments[1];
+    const done = arguments[arguments.length - 1];
+    (async () => {
+        for (const [dy, ms] of schedule) {
+            if (dy) window.scrollBy(0, dy);
+            await new Promise(r => setTimeout(r, ms));
+        }
+        if (scrollTop) window.scrollTo(0, 0);
+        done();
+    })();
+"""
+
+
+def _scroll_schedule(distance: int):
+    """Cronograma de pasos (dy, ms) para un scroll suave de `distance` px"""
+    steps = random.randint(8, 15)
+    step_size = distance / steps
+    schedule = [(step_size, int(random.uniform(20, 80))) for _ in range(steps)]
+    # Pequeña corrección al final (simula ajuste humano)
+    schedule.append((random.randint(-20, 20), int(random.uniform(100, 200))))
+    return schedule
+
+
+def _run_scroll_schedule(driver: WebDriver, schedule, scroll_top: bool = False):
+    try:
+        driver.execute_async_script(_SCROLL_SCHEDULE_JS, [list(p) for p in schedule], scroll_top)
+    except Exception:
+        # Fallback: paso por paso vía WebDriver
+        for dy, ms in schedule:
+            if dy:
+                driver.execute_script(f"window.scrollBy(0, {dy});")
+            time.sleep(ms / 1000.0)
+        if scroll_top:
+            driver.execute_script("window.scrollTo(0, 0);")
+
+
 def random_scroll_smooth(driver: WebDriver, direction: str = 'down', distance: Optional[int] = None):
     """
-    Scroll aleatorio suave que simula lectura humana
-    
+    Scroll aleatorio suave que simula lectura humana.
+    Todo el cronograma de pasos viaja en un solo execute_async_script.
+
     Args:
         driver: WebDriver de Selenium
         direction: 'down' o 'up'
@@ -36,79 +83,143 @@ def random_scroll_smooth(driver: WebDriver, direction: str = 'down', distance: O
     """
     if distance is None:
         distance = random.randint(100, 400)
-    
+
     if direction == 'down':
         distance = abs(distance)
     else:
         distance = -abs(distance)
-    
-    # Scroll en pasos pequeños con pausas
-    steps = random.randint(8, 15)
-    step_size = distance / steps
-    
-    for _ in range(steps):
-        driver.execute_script(f"window.scrollBy(0, {step_size});")
-        time.sleep(random.uniform(0.02, 0.08))
-    
-    # Pequeña corrección al final (simula ajuste humano)
-    correction = random.randint(-20, 20)
-    driver.execute_script(f"window.scrollBy(0, {correction});")
-    time.sleep(random.uniform(0.1, 0.2))
+
+    _run_scroll_schedule(driver, _scroll_schedule(distance))
 
 
 def human_like_scroll_and_read(driver: WebDriver):
     """
-    Simula lectura humana de la página con scroll
+    Simula lectura humana de la página con scroll.
+    Las tres fases (bajar, revisar, bajar y volver al top) se envían como
+    un único cronograma al navegador.
     """
     log("Simulando lectura de página con scroll...")
-    
+
+    schedule = []
     # Scroll down un poco
-    random_scroll_smooth(driver, 'down', random.randint(150, 300))
-    wait_random(0.5, 1.2)
-    
+    schedule += _scroll_schedule(random.randint(150, 300))
+    schedule.append((0, int(random.uniform(500, 1200))))
     # Scroll up un poco (como revisando)
-    random_scroll_smooth(driver, 'up', random.randint(50, 150))
-    wait_random(0.3, 0.8)
-    
+    schedule += _scroll_schedule(-random.randint(50, 150))
+    schedule.append((0, int(random.uniform(300, 800))))
     # Scroll down de nuevo
-    random_scroll_smooth(driver, 'down', random.randint(100, 250))
-    wait_random(0.4, 0.9)
-    
-    # Volver al top
-    driver.execute_script("window.scrollTo(0, 0);")
+    schedule += _scroll_schedule(random.randint(100, 250))
+    schedule.append((0, int(random.uniform(400, 900))))
+
+    # Volver al top al final del cronograma
+    _run_scroll_schedule(driver, schedule, scroll_top=True)
     wait_random(0.3, 0.6)
 
 
 # ============= MOVIMIENTOS DEL CURSOR =============
 
+def _get_actions(driver) -> ActionChains:
+    """
+    Cadena de acciones nueva por gesto. El estado remoto del puntero SÍ
+    persiste entre cadenas: todas comparten el input source W3C "mouse",
+    así que una cadena de click depende de dónde dejó el puntero la
+    cadena de movimiento anterior. reset_actions() está contraindicado
+    acá: manda Release Actions, que borra el input state map de la
+    sesión (incluida la posición del puntero) y encima cuesta un
+    round-trip extra por gesto. Construir la instancia es puro trabajo
+    local, sin tráfico hacia el driver.
+    """
+    return ActionChains(driver)
+
+
+def _bezier_points(control_points, steps: int):
+    """
+    Puntos (x, y) sobre una curva Bézier real (forma de Bernstein),
+    calculados para todos los `steps` de una vez con NumPy.
+    La interpolación anterior era lineal por tramos, no una Bézier.
+
+    Nota: un kernel JIT (numba) no aporta aquí — cada gesto genera
+    ~10-12 puntos y el costo real del movimiento son los round-trips
+    de ActionChains, no esta aritmética ya vectorizada.
+    """
+    P = np.asarray(control_points, dtype=float)
+    n = len(P) - 1
+
+    # Grados triviales: punto fijo o segmento recto
+    if n <= 0:
+        punto = tuple(P[0]) if len(P) else (0.0, 0.0)
+        return [punto] * steps
+
+    t = np.linspace(0.0, 1.0, steps)
+    if n == 1:
+        xy = (1 - t)[:, None] * P[0] + t[:, None] * P[1]
+    else:
+        xy = np.zeros((steps, 2))
+        for k in range(n + 1):
+            coef = math.comb(n, k) * (1 - t) ** (n - k) * t ** k
+            xy += coef[:, None] * P[k]
+
+    return [(float(x), float(y)) for x, y in xy]
+
+
+def _dispatch_trayectoria_cdp(driver, element, offsets) -> bool:
+    """
+    Despacha una trayectoria de mouse como eventos mouseMoved por CDP.
+
+    El WebSocket de devtools es persistente: cada dispatchMouseEvent
+    cuesta sub-milisegundos, contra el round-trip HTTP por cadena de
+    ActionChains. Los offsets son relativos al centro del elemento.
+    Devuelve False si el driver no tiene CDP (caller usa ActionChains).
+    """
+    if not hasattr(driver, "execute_cdp_cmd"):
+        return False
+    try:
+        cx, cy = driver.execute_script(
+            "const r = arguments[0].getBoundingClientRect();"
+            "return [r.x + r.width / 2, r.y + r.height / 2];",
+            element,
+        )
+        for off_x, off_y in offsets:
+            driver.execute_cdp_cmd("Input.dispatchMouseEvent", {
+                "type": "mouseMoved",
+                "x": int(cx + off_x),
+                "y": int(cy + off_y),
+            })
+        # Los mouseMoved de CDP no mueven el puntero W3C: re-sincronizar
+        # con una única cadena para que el click() posterior (que
+        # despacha en la posición W3C actual) caiga sobre el elemento y
+        # no en el origen o donde quedó el gesto anterior
+        _get_actions(driver).move_to_element(element).perform()
+        return True
+    except Exception:
+        return False
+
+
 def move_mouse_in_circle(driver: WebDriver, element: WebElement, radius: int = 50):
     """
     Mueve el mouse en un pequeño círculo alrededor del elemento
     Simula búsqueda visual del objetivo
     """
     log("Movimiento circular del cursor (simulando búsqueda)...")
-    
-    actions = ActionChains(driver)
-    
-    # Mover al elemento primero
-    actions.move_to_element(element).perform()
-    
-    # Crear círculo con 8 puntos
+
+    # Crear círculo con 8 puntos, cerrando en el centro
     points = 8
+    trayectoria = [(0, 0)]
     for i in range(points):
         angle = (2 * math.pi * i) / points
-        offset_x = int(radius * math.cos(angle))
-        offset_y = int(radius * math.sin(angle))
-        
-        actions = ActionChains(driver)
+        trayectoria.append((int(radius * math.cos(angle)), int(radius * math.sin(angle))))
+    trayectoria.append((0, 0))
+
+    # Camino rápido: eventos CDP directos
+    if _dispatch_trayectoria_cdp(driver, element, trayectoria):
+        wait_random(0.1, 0.2)
+        return
+
+    # Fallback: toda la trayectoria en una sola cadena WebDriver
+    actions = _get_actions(driver)
+    for offset_x, offset_y in trayectoria:
         actions.move_to_element_with_offset(element, offset_x, offset_y)
         actions.pause(random.uniform(0.05, 0.12))
-        actions.perform()
-    
-    # Volver al centro
-    actions = ActionChains(driver)
-    actions.move_to_element(element)
-    actions.pause(random.uniform(0.1, 0.2))
     actions.perform()
 
 
@@ -118,24 +229,26 @@ def move_mouse_zigzag(driver: WebDriver, element: WebElement, steps: int = 5):
     Simula movimiento natural humano (no en línea recta)
     """
     log("Movimiento en zigzag del cursor...")
-    
-    # Puntos intermedios con desviación lateral
+
+    # Puntos intermedios con desviación lateral, terminando en el centro
+    trayectoria = []
     for i in range(1, steps + 1):
         progress = i / steps
-        
-        # Desviación lateral aleatoria (zigzag)
         lateral_offset = random.randint(-30, 30) if i < steps else 0
         vertical_offset = int(-50 * progress)  # Avanzar hacia el elemento
-        
-        actions = ActionChains(driver)
+        trayectoria.append((lateral_offset, vertical_offset))
+    trayectoria.append((0, 0))
+
+    # Camino rápido: eventos CDP directos
+    if _dispatch_trayectoria_cdp(driver, element, trayectoria):
+        wait_random(0.1, 0.2)
+        return
+
+    # Fallback: trayectoria encolada en una sola cadena WebDriver
+    actions = _get_actions(driver)
+    for lateral_offset, vertical_offset in trayectoria:
         actions.move_to_element_with_offset(element, lateral_offset, vertical_offset)
         actions.pause(random.uniform(0.05, 0.15))
-        actions.perform()
-    
-    # Movimiento final al centro exacto
-    actions = ActionChains(driver)
-    actions.move_to_element(element)
-    actions.pause(random.uniform(0.1, 0.2))
     actions.perform()
 
 
@@ -157,71 +270,91 @@ def move_mouse_bezier_curve(driver: WebDriver, element: WebElement, control_poin
     # Agregar punto final (centro del elemento)
     points.append((0, 0))
     
-    # Interpolar puntos a lo largo de la curva
-    steps = 12
-    for step in range(steps):
-        t = step / (steps - 1)
-        
-        # Interpolación simple (Bézier cuadrática)
-        if len(points) >= 3:
-            # Punto en la curva
-            idx = int(t * (len(points) - 1))
-            if idx >= len(points) - 1:
-                offset_x, offset_y = points[-1]
-            else:
-                p1 = points[idx]
-                p2 = points[idx + 1]
-                local_t = (t * (len(points) - 1)) - idx
-                offset_x = p1[0] + (p2[0] - p1[0]) * local_t
-                offset_y = p1[1] + (p2[1] - p1[1]) * local_t
-        else:
-            offset_x, offset_y = 0, 0
-        
-        actions = ActionChains(driver)
+    trayectoria = _bezier_points(points, steps=12)
+
+    # Camino rápido: eventos CDP directos (sub-ms por punto)
+    if _dispatch_trayectoria_cdp(driver, element, trayectoria):
+        wait_random(0.1, 0.2)
+        return
+
+    # Fallback: una sola cadena de acciones WebDriver
+    actions = _get_actions(driver)
+    for offset_x, offset_y in trayectoria:
         actions.move_to_element_with_offset(element, int(offset_x), int(offset_y))
         actions.pause(random.uniform(0.04, 0.1))
-        actions.perform()
+
+    actions.perform()
 
 
 # ============= ESCRITURA HUMANA =============
 
+def _segmentar_texto(text: str):
+    """Divide el texto en tramos que terminan en espacio o puntuación"""
+    runs = []
+    actual = ""
+    for char in text:
+        actual += char
+        if char in ' ,.;:':
+            runs.append(actual)
+            actual = ""
+    if actual:
+        runs.append(actual)
+    return runs
+
+
 def human_type(element: WebElement, text: str, base_delay: float = 0.15):
     """
-    Escribe texto caracter por caracter simulando escritura humana realista.
-    Compatible con la firma anterior pero con lógica mejorada de V25.
-    
+    Escribe texto simulando escritura humana realista.
+    En vez de un send_keys por caracter (un round-trip WebDriver cada uno),
+    envía tramos entre pausas: las pausas "humanas" quedan en los límites
+    de palabra/puntuación, donde de verdad se notan.
+
     Args:
         element: WebElement donde escribir
         text: Texto a escribir
-        base_delay: Delay base entre caracteres (default 0.15s)
+        base_delay: Delay base por caracter (default 0.15s)
     """
     log(f"Escribiendo texto: {text[:50]}..." if len(text) > 50 else f"Escribiendo: {text}")
-    
+
     # Limpiar campo
     element.clear()
     time.sleep(random.uniform(0.3, 0.6))
-    
+
     # Click en el campo
     element.click()
     time.sleep(random.uniform(0.2, 0.4))
-    
-    # Escribir caracter por caracter
-    for i, char in enumerate(text):
-        element.send_keys(char)
-        
-        # Delay variable entre caracteres (más natural)
-        delay = max(0.08, random.gauss(base_delay, base_delay * 0.4))
-        time.sleep(delay)
-        
+
+    # Pregenerar TODO el jitter del texto en un solo paso numpy: el
+    # loop solo indexa arrays en vez de llamar al módulo random 3-4
+    # veces por tramo
+    runs = _segmentar_texto(text)
+    n = len(runs)
+    if not n:
+        return
+    rng = np.random.default_rng()
+    delays = np.maximum(0.08, rng.normal(base_delay, base_delay * 0.4, size=n))
+    pausas_espacio = rng.uniform(0.15, 0.35, size=n)
+    pausas_punt = rng.uniform(0.2, 0.4, size=n)
+    piensa = rng.random(n) < 0.35
+    pausas_piensa = rng.uniform(0.15, 0.35, size=n)
+
+    # Escribir por tramos
+    for i, run in enumerate(runs):
+        element.send_keys(run)
+
+        # Pausa equivalente a los delays por caracter del tramo
+        time.sleep(delays[i] * len(run))
+
         # Pausas más largas en espacios y puntuación
-        if char in ' ':
-            time.sleep(random.uniform(0.15, 0.35))
-        elif char in ',.;:':
-            time.sleep(random.uniform(0.2, 0.4))
-        
-        # Cada 5-8 caracteres, pausa adicional (simula pensar)
-        if i > 0 and i % random.randint(5, 8) == 0:
-            time.sleep(random.uniform(0.15, 0.35))
+        ultimo = run[-1]
+        if ultimo == ' ':
+            time.sleep(pausas_espacio[i])
+        elif ultimo in ',.;:':
+            time.sleep(pausas_punt[i])
+
+        # De vez en cuando, pausa adicional (simula pensar)
+        if i > 0 and piensa[i]:
+            time.sleep(pausas_piensa[i])
 
 
 def human_type_advanced(driver: WebDriver, element: WebElement, text: str, base_delay: float = 0.15):
@@ -241,7 +374,7 @@ def human_type_advanced(driver: WebDriver, element: WebElement, text: str, base_
     
     # Click con movimiento previo
     try:
-        actions = ActionChains(driver)
+        actions = _get_actions(driver)
         actions.move_to_element_with_offset(element, random.randint(-10, 10), random.randint(-5, 5))
         actions.pause(random.uniform(0.2, 0.4))
         actions.move_to_element(element)
@@ -253,30 +386,32 @@ def human_type_advanced(driver: WebDriver, element: WebElement, text: str, base_
     
     wait_random(0.3, 0.6)
     
-    # Escribir caracter por caracter
-    for i, char in enumerate(text):
-        element.send_keys(char)
-        
-        delay = max(0.08, random.gauss(base_delay, base_delay * 0.4))
+    # Escribir por tramos (ver human_type); las distracciones de mouse
+    # ocurren entre tramos, donde ya había pausa
+    for i, run in enumerate(_segmentar_texto(text)):
+        element.send_keys(run)
+
+        delay = max(0.08, random.gauss(base_delay, base_delay * 0.4)) * len(run)
         time.sleep(delay)
-        
-        if char in ' ':
+
+        ultimo = run[-1]
+        if ultimo == ' ':
             time.sleep(random.uniform(0.15, 0.35))
-        elif char in ',.;:':
+        elif ultimo in ',.;:':
             time.sleep(random.uniform(0.2, 0.4))
-        
-        if i > 0 and i % random.randint(5, 8) == 0:
+
+        if i > 0 and random.random() < 0.35:
             time.sleep(random.uniform(0.15, 0.35))
-            
+
             # A veces mover el mouse (como distracción)
             if random.random() < 0.3:
                 try:
-                    actions = ActionChains(driver)
+                    actions = _get_actions(driver)
                     actions.move_by_offset(random.randint(-20, 20), random.randint(-20, 20))
                     actions.pause(0.1)
                     actions.perform()
                     # Volver al campo
-                    actions = ActionChains(driver)
+                    actions = _get_actions(driver)
                     actions.move_to_element(element)
                     actions.perform()
                 except:
@@ -321,7 +456,7 @@ def human_click_element(driver: WebDriver, element: WebElement, use_human_moveme
                 move_mouse_bezier_curve(driver, element, control_points=random.randint(2, 4))
             else:
                 # Movimiento "directo" con pequeñas desviaciones
-                actions = ActionChains(driver)
+                actions = _get_actions(driver)
                 actions.move_to_element_with_offset(element, random.randint(-15, 15), random.randint(-10, 10))
                 actions.pause(random.uniform(0.2, 0.4))
                 actions.move_to_element(element)
@@ -329,7 +464,7 @@ def human_click_element(driver: WebDriver, element: WebElement, use_human_moveme
                 actions.perform()
         else:
             # Movimiento simple
-            actions = ActionChains(driver)
+            actions = _get_actions(driver)
             actions.move_to_element(element)
             actions.pause(random.uniform(0.3, 0.7))
             actions.perform()
@@ -338,7 +473,7 @@ def human_click_element(driver: WebDriver, element: WebElement, use_human_moveme
         wait_random(0.4, 0.9)
         
         # Click con pequeña variación
-        actions = ActionChains(driver)
+        actions = _get_actions(driver)
         actions.click()
         actions.pause(random.uniform(0.08, 0.18))
         actions.perform()
@@ -386,40 +521,28 @@ def human_click_offset(driver: WebDriver, element: WebElement, offset_x: int, of
                 points.append((rand_x, rand_y))
             points.append((offset_x, offset_y))
             
-            steps = 10
-            for step in range(steps):
-                t = step / (steps - 1)
-                idx = int(t * (len(points) - 1))
-                if idx >= len(points) - 1:
-                    off_x, off_y = points[-1]
-                else:
-                    p1 = points[idx]
-                    p2 = points[idx + 1]
-                    local_t = (t * (len(points) - 1)) - idx
-                    off_x = p1[0] + (p2[0] - p1[0]) * local_t
-                    off_y = p1[1] + (p2[1] - p1[1]) * local_t
-                
-                actions = ActionChains(driver)
+            actions = _get_actions(driver)
+            for off_x, off_y in _bezier_points(points, steps=10):
                 actions.move_to_element_with_offset(element, int(off_x), int(off_y))
                 actions.pause(random.uniform(0.05, 0.12))
-                actions.perform()
-        
+            actions.perform()
+
         else:  # zigzag
             steps = 6
+            actions = _get_actions(driver)
             for i in range(1, steps + 1):
                 progress = i / steps
                 lateral = random.randint(-40, 40) if i < steps else offset_x
                 vertical = int(offset_y * progress)
-                
-                actions = ActionChains(driver)
+
                 actions.move_to_element_with_offset(element, lateral, vertical)
                 actions.pause(random.uniform(0.08, 0.18))
-                actions.perform()
+            actions.perform()
         
-        # Click en la posición
-        wait_random(0.5, 1.0)
-        actions = ActionChains(driver)
-        actions.pause(random.uniform(0.15, 0.35))
+        # Click en la posición: la espera previa se fusiona con la
+        # pausa inicial de la cadena (un solo wait en vez de dos)
+        actions = _get_actions(driver)
+        actions.pause(random.uniform(0.65, 1.35))
         actions.click()
         actions.pause(random.uniform(0.08, 0.18))
         actions.perform()
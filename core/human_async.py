@@ -0,0 +1,71 @@
+# core/human_async.py
+"""
+Variantes async de las acciones humanas de core/human.py.
+
+Las funciones síncronas bloquean con time.sleep y llamadas Selenium;
+cuando un caller asyncio maneja varias sesiones a la vez, cada espera
+"humana" congela el event loop entero. Aquí los jitters son
+`await asyncio.sleep(...)` y las llamadas Selenium (bloqueantes por
+protocolo) se despachan con `loop.run_in_executor`, de modo que varias
+sesiones puedan avanzar de forma concurrente.
+"""
+
+import asyncio
+import random
+
+from selenium.webdriver.remote.webdriver import WebDriver
+from selenium.webdriver.remote.webelement import WebElement
+
+from core.human import _segmentar_texto, human_click_element
+from core.utils.log import log
+
+
+async def async_wait_random(min_sec: float = 0.5, max_sec: float = 2.0):
+    """Espera con variación humana sin bloquear el event loop"""
+    await asyncio.sleep(random.uniform(min_sec, max_sec))
+
+
+async def _en_executor(func, *args):
+    """Ejecuta una llamada Selenium bloqueante en el executor por defecto"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, func, *args)
+
+
+async def async_human_type(element: WebElement, text: str, base_delay: float = 0.15):
+    """
+    Versión async de human_type: mismos tramos y pausas, pero los
+    send_keys van al executor y las pausas son asyncio.sleep.
+    """
+    log(f"Escribiendo texto (async): {text[:50]}..." if len(text) > 50 else f"Escribiendo (async): {text}")
+
+    await _en_executor(element.clear)
+    await asyncio.sleep(random.uniform(0.3, 0.6))
+
+    await _en_executor(element.click)
+    await asyncio.sleep(random.uniform(0.2, 0.4))
+
+    for i, run in enumerate(_segmentar_texto(text)):
+        await _en_executor(element.send_keys, run)
+
+        delay = max(0.08, random.gauss(base_delay, base_delay * 0.4)) * len(run)
+        await asyncio.sleep(delay)
+
+        ultimo = run[-1]
+        if ultimo == ' ':
+            await asyncio.sleep(random.uniform(0.15, 0.35))
+        elif ultimo in ',.;:':
+            await asyncio.sleep(random.uniform(0.2, 0.4))
+
+        if i > 0 and random.random() < 0.35:
+            await asyncio.sleep(random.uniform(0.15, 0.35))
+
+
+async def async_human_click_element(driver: WebDriver, element: WebElement,
+                                    use_human_movement: bool = True) -> bool:
+    """
+    Versión async de human_click_element. El click completo (scroll,
+    movimiento y ActionChains) es una sola secuencia Selenium, así que
+    se ejecuta entero en el executor; lo que gana el loop es no quedar
+    bloqueado mientras esa sesión "mueve el mouse".
+    """
+    return await _en_executor(human_click_element, driver, element, use_human_movement)
@@ -1,31 +1,75 @@
-import os, json
+import os, json, time
 from datetime import datetime, timedelta
 from ..config import OUTPUT_DIR, CACHE_HOURS
 
+# orjson si está disponible (parse/serialize varias veces más rápido);
+# fallback a stdlib json con la misma interfaz de bytes
+try:
+    import orjson
+    _cache_loads = orjson.loads
+    def _cache_dumps(obj) -> bytes:
+        return orjson.dumps(obj)
+except ImportError:
+    _cache_loads = json.loads
+    def _cache_dumps(obj) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+# Timestamp cacheado por segundo: el formato solo llega a segundos, así
+# que dentro del mismo segundo se reutiliza el string sin re-formatear
+_last_sec = 0
+_last_ts = ""
+
 def log(msg: str):
-    ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    print(f"[{ts}] {msg}", flush=True)
+    global _last_sec, _last_ts
+    sec = int(time.time())
+    if sec != _last_sec:
+        _last_ts = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(sec))
+        _last_sec = sec
+    print(f"[{_last_ts}] {msg}", flush=True)
 
 def load_cache():
     path = os.path.join(OUTPUT_DIR, "cache.json")
-    if os.path.exists(path):
-        try:
-            with open(path, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception:
-            return {}
-    return {}
+    # EAFP: abrir directo en vez de exists()+open (un stat menos y sin
+    # ventana de carrera entre ambos)
+    try:
+        with open(path, "rb") as f:
+            return _cache_loads(f.read()) or {}
+    except FileNotFoundError:
+        return {}
+    except Exception:
+        return {}
 
 def save_cache(cache: dict):
     path = os.path.join(OUTPUT_DIR, "cache.json")
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(cache, f, ensure_ascii=False, indent=2)
+    # Serializar compacto en memoria y reemplazar de forma atómica:
+    # un solo write grande en vez de muchos chicos, y nunca queda un
+    # cache.json truncado si el proceso muere a mitad de escritura
+    # Completar ts_epoch en entradas que solo traen el ISO: el hit se
+    # resuelve con una comparación numérica en vez de fromisoformat
+    for item in cache.values():
+        if isinstance(item, dict) and "ts_epoch" not in item and "timestamp" in item:
+            try:
+                item["ts_epoch"] = datetime.fromisoformat(item["timestamp"]).timestamp()
+            except Exception:
+                pass
+    data = _cache_dumps(cache)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
 
 def cache_hit(cache: dict, key: str):
     item = cache.get(key)
     if not item:
         return None
     try:
+        # Camino rápido: comparación numérica contra el epoch guardado
+        ts_epoch = item.get("ts_epoch")
+        if ts_epoch is not None:
+            if time.time() - ts_epoch < CACHE_HOURS * 3600:
+                return item["data"]
+            return None
+        # Entradas viejas: solo traen el ISO legible
         ts = datetime.fromisoformat(item["timestamp"])
         if datetime.now() - ts < timedelta(hours=CACHE_HOURS):
             return item["data"]
@@ -1,9 +1,75 @@
 #core/utils/screenshot
-import os, base64
+import os, base64, hashlib
 from datetime import datetime
 from ..config import SCREENSHOT_DIR
 
 
+# Dedup de capturas: basename -> (sha256, ruta ya escrita). Flujos con
+# esperas no-op capturan frames idénticos; si los bytes no cambiaron se
+# reutiliza el archivo anterior en vez de reescribirlo
+_last_hashes = {}
+
+
+def reset_screenshot_dedup(driver=None):
+    """Olvida los hashes de dedup (llamar tras una navegación)."""
+    _last_hashes.clear()
+
+
+def _dedup_screenshot(basename: str, img_bytes: bytes):
+    """Ruta previa si estos bytes ya se escribieron para este basename."""
+    h = hashlib.sha256(img_bytes).hexdigest()
+    prev = _last_hashes.get(basename)
+    if prev and prev[0] == h:
+        return h, prev[1]
+    return h, None
+
+
+def _sshot_state(driver) -> dict:
+    """
+    Estado de captura cacheado POR DRIVER (se cuelga como atributo).
+    Evita repetir comandos CDP idempotentes (Page.enable, métricas de
+    dispositivo ya aplicadas) en capturas sucesivas de la misma sesión.
+    """
+    state = getattr(driver, "_sshot", None)
+    if state is None:
+        state = {}
+        driver._sshot = state
+    return state
+
+
+def _enable_page_domain(driver):
+    """Page.enable una sola vez por sesión (es idempotente en CDP)."""
+    state = _sshot_state(driver)
+    if not state.get("page_enabled"):
+        driver.execute_cdp_cmd("Page.enable", {})
+        state["page_enabled"] = True
+
+
+def reset_screenshot_cache(driver):
+    """
+    Invalida el estado cacheado. Llamar tras una navegación si el
+    tamaño del contenido pudo cambiar (las métricas ya no aplican).
+    """
+    try:
+        driver._sshot = {}
+    except Exception:
+        pass
+    reset_screenshot_dedup(driver)
+
+
+def _capture_screenshot_bytes(driver, params: dict) -> bytes:
+    """
+    Page.captureScreenshot devolviendo bytes PNG.
+
+    Nota: Page.captureScreenshot no acepta transferencia por stream
+    (returnAsStream/transferMode existe solo para Page.printToPDF), así
+    que el ~33% extra del base64 en el WebSocket es inevitable acá; el
+    decode igual es una sola pasada en C.
+    """
+    result = driver.execute_cdp_cmd("Page.captureScreenshot", params)
+    return base64.b64decode(result["data"])
+
+
 def save_element_full_screenshot_cdp(driver, element, basename: str) -> str:
     """
     Captura un elemento completo usando CDP, incluso si es más grande que el viewport.
@@ -12,26 +78,25 @@ def save_element_full_screenshot_cdp(driver, element, basename: str) -> str:
     ts = datetime.now().strftime("%Y%m%d_%H%M%S")
     filename = f"{basename}_{ts}.png"
     outpath = os.path.join(SCREENSHOT_DIR, filename)
-    
+
     try:
-        # Habilitar CDP
-        driver.execute_cdp_cmd("Page.enable", {})
-        
-        # Obtener las coordenadas y dimensiones del elemento
-        location = element.location
-        size = element.size
-        
-        # Asegurar que las dimensiones sean válidas
-        x = float(location['x'])
-        y = float(location['y'])
-        width = float(size['width'])
-        height = float(size['height'])
+        # Habilitar CDP (solo la primera vez en esta sesión)
+        _enable_page_domain(driver)
+
+        # Coordenadas y dimensiones del elemento en UNA sola llamada
+        # (element.location + element.size eran dos round-trips WebDriver)
+        x, y, width, height = driver.execute_script(
+            "const r = arguments[0].getBoundingClientRect();"
+            "return [r.x + window.scrollX, r.y + window.scrollY, r.width, r.height];",
+            element,
+        )
+        x, y, width, height = float(x), float(y), float(width), float(height)
         
         if width <= 0 or height <= 0:
             raise Exception(f"Dimensiones inválidas: width={width}, height={height}")
         
         # Capturar usando CDP con las coordenadas exactas del elemento
-        result = driver.execute_cdp_cmd("Page.captureScreenshot", {
+        img_bytes = _capture_screenshot_bytes(driver, {
             "format": "png",
             "captureBeyondViewport": True,
             "fromSurface": True,
@@ -43,12 +108,21 @@ def save_element_full_screenshot_cdp(driver, element, basename: str) -> str:
                 "scale": 1
             }
         })
-        
+
+        # Si la captura es idéntica a la anterior de este basename,
+        # reutilizar el archivo ya escrito
+        h, prev_path = _dedup_screenshot(basename, img_bytes)
+        if prev_path:
+            log(f"📸 Captura sin cambios, se reutiliza: {prev_path}")
+            return prev_path
+
         # Guardar la imagen
         with open(outpath, "wb") as f:
-            f.write(base64.b64decode(result["data"]))
-        
-        return os.path.abspath(outpath)
+            f.write(img_bytes)
+
+        outpath = os.path.abspath(outpath)
+        _last_hashes[basename] = (h, outpath)
+        return outpath
         
     except Exception as e:
         print(f"ERROR en captura CDP del elemento: {e}")
@@ -108,8 +182,16 @@ from core.utils.log import log
 # Carpeta de salida por defecto (ajústala si usas otra)
 OUTPUT_DIR = os.getenv("SCREENSHOT_DIR", "sri_ruc_output/screenshots")
 
+# Directorios ya verificados en este proceso: makedirs camina el path
+# con un stat por componente, y se llamaba antes de cada captura
+_ensured_dirs = set()
+
 def _ensure_dir(path: str):
-    os.makedirs(os.path.dirname(path), exist_ok=True)
+    d = os.path.dirname(path)
+    if d in _ensured_dirs:
+        return
+    os.makedirs(d, exist_ok=True)
+    _ensured_dirs.add(d)
 
 def _abs_path(basename: str) -> str:
     filename = f"{basename}.png" if not basename.lower().endswith(".png") else basename
@@ -126,14 +208,24 @@ def save_fullpage_png(driver, basename: str) -> str:
     """
     path = _abs_path(basename)
 
-    # Detectar navegador
-    name = (driver.capabilities.get("browserName") or "").lower()
+    # Detectar navegador una sola vez por driver: la rama resuelta se
+    # cachea como atributo (capabilities no cambia durante la sesión)
+    kind = getattr(driver, "_sshot_kind", None)
+    if kind is None:
+        name = (driver.capabilities.get("browserName") or "").lower()
+        if any(x in name for x in ("chrome", "chromium", "edge")):
+            kind = "cdp"
+        elif "firefox" in name:
+            kind = "firefox"
+        else:
+            kind = "besteffort"
+        driver._sshot_kind = kind
 
     try:
-        if "chrome" in name or "chromium" in name or "edge" in name:
-            # Asegurar que el dominio Page esté habilitado
+        if kind == "cdp":
+            # Asegurar que el dominio Page esté habilitado (una vez por sesión)
             try:
-                driver.execute_cdp_cmd("Page.enable", {})
+                _enable_page_domain(driver)
             except Exception:
                 pass
 
@@ -152,21 +244,27 @@ def save_fullpage_png(driver, basename: str) -> str:
                 )
             )
 
-            # Fijar métricas para que la captura abarque todo
-            driver.execute_cdp_cmd(
-                "Emulation.setDeviceMetricsOverride",
-                {
-                    "mobile": False,
-                    "width": content_width,
-                    "height": content_height,
-                    "deviceScaleFactor": 1,
-                    "scale": 1,
-                },
-            )
+            # Fijar métricas para que la captura abarque todo.
+            # Si el contenido no cambió desde la captura anterior, las
+            # métricas ya están aplicadas y se ahorra el round-trip.
+            state = _sshot_state(driver)
+            metrics_key = (content_width, content_height, 1)
+            if state.get("metrics") != metrics_key:
+                driver.execute_cdp_cmd(
+                    "Emulation.setDeviceMetricsOverride",
+                    {
+                        "mobile": False,
+                        "width": content_width,
+                        "height": content_height,
+                        "deviceScaleFactor": 1,
+                        "scale": 1,
+                    },
+                )
+                state["metrics"] = metrics_key
 
             # Capturar más allá del viewport
-            result = driver.execute_cdp_cmd(
-                "Page.captureScreenshot",
+            img_bytes = _capture_screenshot_bytes(
+                driver,
                 {
                     "fromSurface": True,
                     "captureBeyondViewport": True,
@@ -174,13 +272,17 @@ def save_fullpage_png(driver, basename: str) -> str:
                     # "clip": {"x": 0, "y": 0, "width": content_width, "height": content_height, "scale": 1}
                 },
             )
-            img_bytes = base64.b64decode(result["data"])
+            h, prev_path = _dedup_screenshot(basename, img_bytes)
+            if prev_path:
+                log(f"📸 Fullpage sin cambios, se reutiliza: {prev_path}")
+                return prev_path
             with open(path, "wb") as f:
                 f.write(img_bytes)
+            _last_hashes[basename] = (h, path)
             log(f"📸 Fullpage (CDP) guardado en: {path}")
             return path
 
-        elif "firefox" in name:
+        elif kind == "firefox":
             # Firefox tiene API nativa de full page
             if hasattr(driver, "get_full_page_screenshot_as_file"):
                 driver.get_full_page_screenshot_as_file(path)
@@ -218,11 +320,12 @@ def save_fullpage_png(driver, basename: str) -> str:
 
 
 # --- AÑADIR EN: core/utils/screenshot.py ---
-import os, time
+import io, os, time
 from core.utils.log import log
 
 try:
     from PIL import Image
+    import numpy as np
     _HAS_PILLOW = True
 except Exception:
     _HAS_PILLOW = False
@@ -230,7 +333,11 @@ except Exception:
 OUTPUT_DIR = os.getenv("SCREENSHOT_DIR", "sri_ruc_output/screenshots")
 
 def _ensure_dir(path: str):
-    os.makedirs(os.path.dirname(path), exist_ok=True)
+    d = os.path.dirname(path)
+    if d in _ensured_dirs:
+        return
+    os.makedirs(d, exist_ok=True)
+    _ensured_dirs.add(d)
 
 def _abs_path(basename: str) -> str:
     filename = f"{basename}.png" if not basename.lower().endswith(".png") else basename
@@ -294,8 +401,9 @@ def save_scrollable_container_png(driver, css_selector: str, basename: str, over
         log(f"📸 Contenedor (una vista) guardado: {out}")
         return out
 
-    # 3) Capturar por tramos
-    parts = []
+    # 3) Capturar por tramos EN MEMORIA: las partes se descartaban tras
+    # coser, así que escribirlas a disco era puro I/O desperdiciado
+    parts_mem = []
     y = 0
     idx = 1
     step = max(vh - overlap_px, 100)
@@ -304,12 +412,23 @@ def save_scrollable_container_png(driver, css_selector: str, basename: str, over
     driver.execute_script("arguments[0].scrollTo(0, 0);", elem)
     time.sleep(0.25)
 
+    # Scroll + espera de pintado dirigida por eventos: en vez de dormir
+    # 0.12s fijos por tramo, se resuelve tras dos requestAnimationFrame
+    # (el primero encola, el segundo corre con el frame ya pintado)
+    scroll_and_paint_js = """
+        const el = arguments[0], y = arguments[1], cb = arguments[2];
+        el.scrollTo(0, y);
+        requestAnimationFrame(() => requestAnimationFrame(() => cb(0)));
+    """
+
     while y < total:
-        driver.execute_script(f"arguments[0].scrollTo(0, {y});", elem)
-        time.sleep(0.12)  # deja pintar
-        part_path = _abs_path_parts(basename, idx)
-        elem.screenshot(part_path)  # recorta SOLO el elemento, no el viewport
-        parts.append(part_path)
+        try:
+            driver.execute_async_script(scroll_and_paint_js, elem, y)
+        except Exception:
+            # Fallback al sleep fijo si execute_async_script no está disponible
+            driver.execute_script(f"arguments[0].scrollTo(0, {y});", elem)
+            time.sleep(0.12)
+        parts_mem.append(elem.screenshot_as_png)  # recorta SOLO el elemento
         y += step
         idx += 1
 
@@ -320,39 +439,43 @@ def save_scrollable_container_png(driver, css_selector: str, basename: str, over
     # 4) Intentar coser
     if _HAS_PILLOW:
         try:
-            images = [Image.open(p) for p in parts]
-            widths = [im.size[0] for im in images]
-            heights = [im.size[1] for im in images]
-            max_w = max(widths)
+            images = [Image.open(io.BytesIO(b)) for b in parts_mem]
+            # Un solo buffer numpy preasignado: cada parte se copia con
+            # asignación de slice (sin los crop/paste intermedios de
+            # Pillow, que duplican el tráfico de memoria)
+            arrs = [np.asarray(im.convert("RGB")) for im in images]
+            heights = [a.shape[0] for a in arrs]
+            max_w = max(a.shape[1] for a in arrs)
             # Al coser, quitar el solape de todas menos la primera
             total_h = heights[0] + sum(h - overlap_px for h in heights[1:])
 
-            stitched = Image.new("RGB", (max_w, total_h))
+            stitched = np.zeros((total_h, max_w, 3), dtype=np.uint8)
             yoff = 0
-            for i, im in enumerate(images):
+            for i, arr in enumerate(arrs):
                 if i == 0:
-                    stitched.paste(im, (0, yoff))
-                    yoff += im.size[1]
+                    stitched[:heights[0], :arr.shape[1]] = arr
+                    yoff = heights[0]
                 else:
-                    # recortar el solape superior
-                    crop = im.crop((0, overlap_px, im.size[0], im.size[1]))
-                    stitched.paste(crop, (0, yoff - overlap_px))
-                    yoff += (im.size[1] - overlap_px)
+                    # descartar el solape superior vía slice
+                    recorte = arr[overlap_px:]
+                    stitched[yoff:yoff + recorte.shape[0], :arr.shape[1]] = recorte
+                    yoff += recorte.shape[0]
 
-            stitched.save(out)
+            # optimize cambia CPU por un PNG final más chico
+            Image.fromarray(stitched).save(out, optimize=True, compress_level=6)
             for im in images:
                 im.close()
-            # Limpia partes
-            for p in parts:
-                try:
-                    os.remove(p)
-                except Exception:
-                    pass
             log(f"🧵 PNG cosido (contenedor) guardado: {out}")
             return out
         except Exception as e:
             log(f"⚠️ No se pudo coser (Pillow): {e}")
 
-    # 5) Sin Pillow: devolver primera parte
+    # 5) Sin Pillow: volcar las partes a disco y devolver la primera
+    parts = []
+    for i, b in enumerate(parts_mem, start=1):
+        part_path = _abs_path_parts(basename, i)
+        with open(part_path, "wb") as f:
+            f.write(b)
+        parts.append(part_path)
     log(f"📚 Guardadas {len(parts)} partes del contenedor. Instala Pillow para coser.")
     return parts[0] if parts else out
@@ -2,91 +2,538 @@
 
 
 # core/utils/tee.py
+import atexit
+import io
+import os
+import queue
 import sys
+import threading
+import time
+import weakref
 from datetime import datetime
 from ..config import LOG_FILE
 
+# Ventana mínima entre flushes reales: logging llama flush() tras cada
+# registro, lo que forzaba un syscall por línea y anulaba el buffer
+_FLUSH_INTERVAL_S = 0.05
+
+# Si una ráfaga infló el buffer propio más allá de esto, tras drenarlo
+# se suelta la asignación en vez de conservarla de por vida
+_BUF_SHRINK_BYTES = 131072
+
+# Partes fijas de cabecera/pie de sesión, pre-codificadas una sola vez;
+# solo el timestamp se formatea al arrancar/cerrar
+_HEADER_PREFIX = b"\n========== RUN START "
+_HEADER_SUFFIX = b" ==========\n"
+_FOOTER_PREFIX = b"=========== RUN END "
+_FOOTER_SUFFIX = b" ===========\n"
+
+
+# Nota sobre os.writev/os.write directo: se evaluó saltar los wrappers
+# de Python escribiendo a los fd crudos, pero los dos destinos son fds
+# distintos (writev no aplica entre archivos diferentes) y un os.write
+# directo al fd del log se saltaría el BufferedWriter de 64 KiB, que es
+# justo lo que coalesce los syscalls. Los métodos pre-bindeados de
+# _TeeStream ya dejan el camino de write en dos llamadas C.
+#
+# Tampoco se bajó write() a una extensión Cython/C: este proyecto se
+# despliega como Python puro (requirements.txt, sin paso de build) y el
+# camino actual ya es un append a bytearray más el write C de la
+# consola; el margen restante no justifica compilar nativo.
+#
+# io_uring quedó igualmente descartado: exigiría el binding liburing
+# (no es dependencia del proyecto, solo Linux con kernel reciente) más
+# un hilo para cosechar completions, cuando el buffer de 64 KiB ya deja
+# los syscalls de log muy por debajo de uno por línea.
+class _LogWriter(threading.Thread):
+    """
+    Consumidor único del log: los _TeeStream solo encolan bytes y este
+    hilo daemon los drena al fd en lotes (hasta 64 KiB o 5 ms de
+    espera), sacando el write() a disco del camino crítico de quien
+    hace print. stdout y stderr comparten la cola, así el orden
+    relativo entre ambos se conserva en el archivo.
+    """
+
+    def __init__(self, log_fd):
+        super().__init__(daemon=True, name="tee-log-writer")
+        self.cola = queue.SimpleQueue()
+        self._fd = log_fd
+        self._buf = bytearray()
+
+    def run(self):
+        while True:
+            item = self.cola.get()
+            if item is None:
+                self._drain()
+                return
+            self._agregar(item)
+            # Acumular lo que ya esté encolado antes de tocar el disco
+            while len(self._buf) < 65536:
+                try:
+                    item = self.cola.get(timeout=0.005)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._drain()
+                    return
+                self._agregar(item)
+            self._drain()
+
+    def _agregar(self, item):
+        # Si algo encoló str u otro tipo inesperado, no dejar morir el
+        # hilo: un TypeError acá mataría al único consumidor y todo lo
+        # encolado después se perdería en silencio
+        try:
+            self._buf += item
+        except TypeError:
+            try:
+                self._buf += str(item).encode("utf-8", "replace")
+            except Exception:
+                pass
+
+    def _drain(self):
+        if not self._buf:
+            return
+        with memoryview(self._buf) as view:
+            escrito = 0
+            total = len(view)
+            while escrito < total:
+                escrito += os.write(self._fd, view[escrito:])
+        if total > _BUF_SHRINK_BYTES:
+            self._buf = bytearray()
+        else:
+            del self._buf[:]
+
+    def detener(self):
+        """Encola el centinela y espera a que todo quede en disco."""
+        self.cola.put(None)
+        self.join(timeout=5)
+
+
+def _flush_silencioso(handle):
+    """Backstop de cierre: intenta drenar el handle del log e ignora
+    cualquier error (el archivo puede estar ya cerrado)."""
+    try:
+        handle.flush()
+    except Exception:
+        pass
+
+
 class _TeeStream:
-    def __init__(self, original_stream, log_file_handle):
+    def __init__(self, original_stream, log_file_handle, log_q=None):
+        # Sink del log por fd crudo: se acumula en un bytearray propio
+        # y se drena con un os.write, sin pasar por la pila
+        # TextIOWrapper → BufferedWriter en cada print.
+        self._buf = bytearray()
+        self._buf_cap = 65536
+        self._finalizer = None
+        self._rebind(original_stream, log_file_handle, log_q)
+
+    def _rebind(self, original_stream, log_file_handle, log_q=None):
+        """
+        Reapunta los destinos reutilizando la instancia (y su buffer)
+        entre ciclos start/stop, en vez de construir wrappers nuevos.
+        Métodos pre-resueltos: write() corre en cada print(), y los
+        lookups de atributo por llamada dominaban el costo.
+        """
         self._original = original_stream
         self._file = log_file_handle
-
-    def write(self, data):
-        # Escribimos en ambos destinos
+        self._ow = original_stream.write
+        self._fw = log_file_handle.write
+        self._of = original_stream.flush
+        self._ff = log_file_handle.flush
+        self._dirty = False
+        self._last_flush = 0.0
+        self._q = log_q  # cola hacia el hilo escritor, si hay uno
+        self._flush_timer = None
+        del self._buf[:]
+        # Finalizer por ciclo: si el intérprete muere sin pasar por
+        # stop() (atexit desregistrado, os._exit parcial), al menos el
+        # handle del log intenta drenarse. weakref.finalize en vez de
+        # __del__: corre de forma confiable al apagar y no revive el
+        # objeto. Solo captura el handle, nunca self
+        if self._finalizer is not None:
+            self._finalizer.detach()
+        self._finalizer = weakref.finalize(self, _flush_silencioso, log_file_handle)
+        try:
+            self._log_fd = log_file_handle.fileno()
+        except Exception:
+            self._log_fd = None  # sin fd real (p. ej. StringIO): vía _fw
+        # Consola por bytes (codificar UNA vez y repartir a ambos
+        # destinos) solo cuando no es tty: en una terminal el write de
+        # texto conserva el line-buffering y la salida inmediata
+        # isatty/fileno cacheados: rich, click y tqdm los martillean
+        # durante el render de progreso, y el resultado no cambia
+        # mientras el stream original siga siendo el mismo
+        es_tty = False
         try:
-            self._original.write(data)
+            es_tty = bool(original_stream.isatty())
         except Exception:
             pass
+        self._is_tty = es_tty
+        try:
+            self._fno = original_stream.fileno()
+        except Exception:
+            self._fno = None
+
+        ob = getattr(original_stream, "buffer", None)
+        if ob is not None and not es_tty:
+            self._ob_write = ob.write
+            self._ob_flush = ob.flush
+        else:
+            self._ob_write = None
+            self._ob_flush = None
+
+    def _drain_log(self):
+        """Vuelca el buffer propio al fd del log con os.write."""
+        if not self._buf:
+            return
+        # El TextIOWrapper del log solo lleva cabecera/pie; drenarlo
+        # antes para no intercalar
         try:
-            self._file.write(data)
+            self._ff()
         except Exception:
             pass
+        # El memoryview debe liberarse antes de clear(): un bytearray
+        # con exports vivos no se puede redimensionar (BufferError)
+        with memoryview(self._buf) as view:
+            escrito = 0
+            total = len(view)
+            while escrito < total:
+                escrito += os.write(self._log_fd, view[escrito:])
+        if total > _BUF_SHRINK_BYTES:
+            # Ráfaga excepcional: soltar la asignación grande en vez de
+            # retenerla el resto del proceso
+            self._buf = bytearray()
+        else:
+            # Vaciar conservando la asignación C subyacente: el próximo
+            # append no vuelve a crecer desde cero
+            del self._buf[:]
 
     def flush(self):
+        # Sin escrituras pendientes no hay nada que drenar. Dentro de la
+        # ventana de coalescing no se pierde el flush: se debouncea con
+        # un único Timer pendiente que lo ejecuta al cerrarse la ventana
+        if not self._dirty:
+            return
+        now = time.monotonic()
+        if now - self._last_flush >= _FLUSH_INTERVAL_S:
+            self.flush_force()
+            return
+        if self._flush_timer is None:
+            t = threading.Timer(_FLUSH_INTERVAL_S, self._flush_programado)
+            t.daemon = True
+            self._flush_timer = t
+            t.start()
+
+    def _flush_programado(self):
+        self._flush_timer = None
+        if self._dirty:
+            self.flush_force()
+
+    def flush_force(self):
+        """Drena buffer propio y ambos destinos sin gate de intervalo."""
+        t = self._flush_timer
+        if t is not None:
+            self._flush_timer = None
+            t.cancel()
         try:
-            self._original.flush()
+            if self._log_fd is not None:
+                self._drain_log()
         except Exception:
             pass
         try:
-            self._file.flush()
+            self._of()
+            if self._ob_flush is not None:
+                self._ob_flush()
         except Exception:
             pass
+        try:
+            self._ff()
+        except Exception:
+            pass
+        self._dirty = False
+        self._last_flush = time.monotonic()
 
-    # Compatibilidad con algunas librerías
+    # Compatibilidad con algunas librerías (resultados cacheados en
+    # _rebind: una carga de atributo en vez de try/except por llamada)
     def isatty(self):
+        return self._is_tty
+
+    def fileno(self):
+        if self._fno is None:
+            raise OSError("No fileno")
+        return self._fno
+
+
+class _TextTee(_TeeStream):
+    """write() especializado para streams de texto: asume str y paga la
+    codificación utf-8 una sola vez para consola y log."""
+
+    def write(self, data):
+        # Algunas librerías de logging hacen write("") como separador:
+        # cortar acá antes de tocar ningún destino
+        if not data:
+            return 0
+
+        self._dirty = True
+
+        # Camino rápido: consola directa + log acumulado en un solo try
         try:
-            return self._original.isatty()
+            if self._q is not None:
+                # Con hilo escritor: la consola se atiende acá y el log
+                # solo se encola (el caller no espera el disco)
+                b = data.encode("utf-8")
+                if self._ob_write is not None:
+                    self._ob_write(b)
+                else:
+                    self._ow(data)
+                self._q.put(b)
+            elif self._log_fd is not None:
+                # Codificar una sola vez para ambos destinos
+                b = data.encode("utf-8")
+                if self._ob_write is not None:
+                    self._ob_write(b)
+                else:
+                    self._ow(data)
+                self._buf += b
+                if len(self._buf) >= self._buf_cap:
+                    self._drain_log()
+            else:
+                self._ow(data)
+                self._fw(data)
         except Exception:
-            return False
+            # Falló la consola o el log; asegurar al menos el log
+            try:
+                if self._q is not None:
+                    self._q.put(data.encode("utf-8", "replace"))
+                elif self._log_fd is not None:
+                    self._drain_log()
+                else:
+                    self._fw(data)
+            except Exception:
+                pass
+        # Protocolo io: devolver cuánto se "escribió" (None rompe a
+        # callers como logging.StreamHandler)
+        return len(data)
+
+    def writelines(self, lines):
+        # logging y varios frameworks usan writelines al volcar un
+        # registro bufferizado: unir una vez y pagar un solo write
+        # (una codificación, un encolado) en vez de uno por línea
+        self.write("".join(lines))
+
+
+class _BytesTee(_TeeStream):
+    """write() especializado para streams binarios (sys.stdout.buffer
+    envuelto, o un runner que reemplazó stdout por un stream de bytes):
+    los datos ya son bytes, sin codificar nada."""
+
+    def write(self, data):
+        if not data:
+            return 0
+
+        self._dirty = True
 
-    def fileno(self):
         try:
-            return self._original.fileno()
+            if self._q is not None:
+                self._ow(data)
+                self._q.put(data)
+            elif self._log_fd is not None:
+                self._ow(data)
+                self._buf += data
+                if len(self._buf) >= self._buf_cap:
+                    self._drain_log()
+            else:
+                self._ow(data)
+                self._fw(data)
         except Exception:
-            raise OSError("No fileno")
+            try:
+                if self._q is not None:
+                    self._q.put(bytes(data))
+                elif self._log_fd is not None:
+                    self._drain_log()
+                else:
+                    self._fw(data)
+            except Exception:
+                pass
+        return len(data)
 
-# Estado global simple
-_ORIG_STDOUT = None
-_ORIG_STDERR = None
-_LOG_HANDLE = None
+    def writelines(self, lines):
+        self.write(b"".join(lines))
 
-def start_tee(append: bool = True):
-    global _ORIG_STDOUT, _ORIG_STDERR, _LOG_HANDLE
-    if _LOG_HANDLE is not None:
-        return  # ya activado
 
-    mode = "a" if append else "w"
-    _LOG_HANDLE = open(LOG_FILE, mode, encoding="utf-8", buffering=1)  # line-buffered
+def _clase_tee(original_stream):
+    """Elige la especialización según el modo del stream original, en
+    vez de decidir str-vs-bytes dentro de cada write().
 
-    # Cabecera de sesión
-    header = f"\n========== RUN START {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ==========\n"
-    _LOG_HANDLE.write(header)
-    _LOG_HANDLE.flush()
+    El default es texto: los wrappers duck-typed sobre stdout (colorama,
+    shims de captura) no heredan de TextIOBase pero reciben str; solo un
+    stream binario inequívoco (RawIOBase/BufferedIOBase) va por bytes.
+    """
+    if isinstance(original_stream, (io.RawIOBase, io.BufferedIOBase)):
+        return _BytesTee
+    return _TextTee
 
-    _ORIG_STDOUT = sys.stdout
-    _ORIG_STDERR = sys.stderr
 
-    sys.stdout = _TeeStream(_ORIG_STDOUT, _LOG_HANDLE)
-    sys.stderr = _TeeStream(_ORIG_STDERR, _LOG_HANDLE)
+class Tee:
+    """
+    Tee de stdout/stderr con estado propio por instancia.
 
-def stop_tee():
-    global _ORIG_STDOUT, _ORIG_STDERR, _LOG_HANDLE
-    if _LOG_HANDLE is None:
-        return
+    El estado vivía en tres globals del módulo, lo que impedía tener
+    más de un tee a la vez (p. ej. uno con alcance de test o de worker).
+    start_tee/stop_tee siguen operando sobre un singleton del módulo.
+    """
 
-    # Restaurar
-    if _ORIG_STDOUT is not None:
-        sys.stdout = _ORIG_STDOUT
-    if _ORIG_STDERR is not None:
-        sys.stderr = _ORIG_STDERR
+    __slots__ = ("_orig_out", "_orig_err", "_log", "_tee_out", "_tee_err",
+                 "_writer")
 
-    try:
-        _LOG_HANDLE.write(f"=========== RUN END {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ===========\n")
-        _LOG_HANDLE.flush()
-        _LOG_HANDLE.close()
-    except Exception:
-        pass
+    def __init__(self):
+        self._orig_out = None
+        self._orig_err = None
+        self._log = None
+        self._tee_out = None
+        self._tee_err = None
+        self._writer = None
 
-    _ORIG_STDOUT = None
-    _ORIG_STDERR = None
-    _LOG_HANDLE = None
+    def start(self, append: bool = True):
+        if self._log is not None:
+            return  # ya activado
+
+        # Buffer de 64 KiB en vez de line-buffering: con buffering=1 cada
+        # '\n' de un print era un write() a disco; así muchos prints se
+        # coalescen en un solo syscall y stop/atexit drenan el resto
+        # os.open directo: O_APPEND hace atómico cada append a nivel
+        # POSIX (sin lockfile aunque haya varios procesos sobre el
+        # mismo log) y O_CLOEXEC evita filtrar el fd a los subprocesos
+        # que lanza el proyecto
+        flags = os.O_WRONLY | os.O_CREAT
+        flags |= os.O_APPEND if append else os.O_TRUNC
+        flags |= getattr(os, "O_CLOEXEC", 0)
+        flags |= getattr(os, "O_BINARY", 0)  # Windows
+        try:
+            fd = os.open(LOG_FILE, flags, 0o644)
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
+            fd = os.open(LOG_FILE, flags, 0o644)
+        # buffering=0 da el FileIO crudo: sin él quedaría un doble
+        # buffer que retiene los datos
+        raw = os.fdopen(fd, "wb", buffering=0)
+
+        # Si el proceso ya corre con `python app.py > logfile` y stdout
+        # apunta al mismo archivo (mismo inode/dispositivo), duplicar
+        # cada byte al mismo destino es 100% I/O desperdiciado: no
+        # interceptar nada
+        try:
+            st_log = os.fstat(raw.fileno())
+            st_out = os.fstat(sys.stdout.fileno())
+            if (st_log.st_ino, st_log.st_dev) == (st_out.st_ino, st_out.st_dev):
+                raw.close()
+                print("tee: stdout ya escribe en LOG_FILE, no se duplica")
+                return
+        except Exception:
+            pass  # stdout sin fileno real (ya envuelto, tty raro): seguir
+        self._log = io.TextIOWrapper(
+            io.BufferedWriter(raw, buffer_size=65536),
+            encoding="utf-8",
+            write_through=False,
+            newline="",
+        )
+        atexit.register(self.stop)
+
+        # Cabecera de sesión: directo al buffer binario, sin pasar por el
+        # TextIOWrapper para las partes constantes
+        ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S").encode("ascii")
+        self._log.buffer.write(_HEADER_PREFIX + ts + _HEADER_SUFFIX)
+        # flush() del TextIOWrapper no drena lo escrito directo en
+        # .buffer: hay que vaciar el BufferedWriter explícitamente
+        self._log.buffer.flush()
+
+        # Hilo escritor único para el log; stdout y stderr comparten cola
+        self._writer = _LogWriter(raw.fileno())
+        self._writer.start()
+
+        self._orig_out = sys.stdout
+        self._orig_err = sys.stderr
+
+        # Si stderr ya apunta al mismo destino que stdout (`2>&1`,
+        # terminales y runtimes de contenedor suelen fusionarlos), un
+        # solo wrapper alcanza. Se compara inode/dispositivo y no el
+        # número de fd: 1 y 2 son números distintos aunque dupliquen
+        # el mismo archivo
+        mismo_fd = False
+        try:
+            st_out = os.fstat(self._orig_out.fileno())
+            st_err = os.fstat(self._orig_err.fileno())
+            mismo_fd = (st_err.st_ino, st_err.st_dev) == (st_out.st_ino, st_out.st_dev)
+        except Exception:
+            pass
+
+        # Reutilizar los wrappers de ciclos anteriores si existen y
+        # siguen siendo de la especialización correcta para el stream
+        clase_out = _clase_tee(self._orig_out)
+        if type(self._tee_out) is clase_out:
+            self._tee_out._rebind(self._orig_out, self._log, self._writer.cola)
+        else:
+            self._tee_out = clase_out(self._orig_out, self._log, self._writer.cola)
+
+        if mismo_fd:
+            self._tee_err = None
+        else:
+            clase_err = _clase_tee(self._orig_err)
+            if type(self._tee_err) is clase_err:
+                self._tee_err._rebind(self._orig_err, self._log, self._writer.cola)
+            else:
+                self._tee_err = clase_err(self._orig_err, self._log, self._writer.cola)
+
+        sys.stdout = self._tee_out
+        sys.stderr = self._tee_out if mismo_fd else self._tee_err
+
+    def stop(self):
+        if self._log is None:
+            return
+
+        # Drenar los buffers propios de los tees antes de restaurar
+        for tee in (self._tee_out, self._tee_err):
+            if tee is not None:
+                tee.flush_force()
+
+        # Parar el hilo escritor (drena la cola completa antes de volver)
+        if self._writer is not None:
+            self._writer.detener()
+            self._writer = None
+
+        # Restaurar
+        if self._orig_out is not None:
+            sys.stdout = self._orig_out
+        if self._orig_err is not None:
+            sys.stderr = self._orig_err
+
+        try:
+            ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S").encode("ascii")
+            self._log.flush()
+            self._log.buffer.write(_FOOTER_PREFIX + ts + _FOOTER_SUFFIX)
+            # Durabilidad opt-in: TEE_FSYNC=1 fuerza el fsync al cerrar
+            # (útil en corridas donde el host puede morir); por defecto
+            # se evita porque el fsync bloquea hasta el disco
+            if os.environ.get("TEE_FSYNC") == "1":
+                self._log.buffer.flush()
+                os.fsync(self._log.fileno())
+            self._log.close()
+        except Exception:
+            pass
+
+        self._orig_out = None
+        self._orig_err = None
+        self._log = None
+        # _tee_out/_tee_err se conservan vivos para el próximo start
+
+
+# Singleton del módulo: la API histórica sigue funcionando igual
+_default = Tee()
+
+def start_tee(append: bool = True):
+    _default.start(append)
+
+def stop_tee():
+    _default.stop()